@@ -0,0 +1,148 @@
+"""
+Compressed bitmaps of record identifiers for the bitmap indices of low-cardinality columns.
+Like a roaring bitmap, the RIDs are split into chunks of CHUNK_BITS low bits and only the chunks holding a RID are stored,
+every chunk is a Python integer used as a bitset so AND and OR of two bitmaps run chunk by chunk at native speed.
+Hash index entries without included values keep their RIDs in a sorted RidArray instead.
+"""
+from array import array
+from bisect import bisect_left
+
+CHUNK_BITS = 16  # Number of low bits of a RID addressed inside a chunk
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+class Bitmap:
+
+    def __init__(self, rids=()):
+        # The chunks holding at least one RID by the high bits of their RIDs, bit i of a chunk is set when its RID i is in the bitmap
+        self.chunks: dict[int, int] = {}
+        for rid in rids:
+            self.add(rid)
+
+    def add(self, rid: int):
+        high = rid >> CHUNK_BITS
+        self.chunks[high] = self.chunks.get(high, 0) | (1 << (rid & CHUNK_MASK))
+
+    def discard(self, rid: int):
+        high = rid >> CHUNK_BITS
+        chunk = self.chunks.get(high, 0) & ~(1 << (rid & CHUNK_MASK))
+        if chunk == 0:
+            self.chunks.pop(high, None)
+        else:
+            self.chunks[high] = chunk
+
+    def update(self, rids):
+        for rid in rids:
+            self.add(rid)
+
+    def __contains__(self, rid):
+        return (self.chunks.get(rid >> CHUNK_BITS, 0) >> (rid & CHUNK_MASK)) & 1 == 1
+
+    def __len__(self):
+        return sum(chunk.bit_count() for chunk in self.chunks.values())
+
+    def __iter__(self):
+        """
+        Iterate the RIDs in ascending order.
+        """
+        for high in sorted(self.chunks):
+            chunk = self.chunks[high]
+            base = high << CHUNK_BITS
+            while chunk:
+                low = chunk & -chunk
+                yield base + low.bit_length() - 1
+                chunk ^= low
+
+    def copy(self):
+        result = Bitmap()
+        result.chunks = dict(self.chunks)
+        return result
+
+    def __and__(self, other: 'Bitmap'):
+        result = Bitmap()
+        small, large = (self, other) if len(self.chunks) <= len(other.chunks) else (other, self)
+        for high, chunk in small.chunks.items():
+            chunk &= large.chunks.get(high, 0)
+            if chunk != 0:
+                result.chunks[high] = chunk
+        return result
+
+    def __or__(self, other: 'Bitmap'):
+        result = self.copy()
+        for high, chunk in other.chunks.items():
+            result.chunks[high] = result.chunks.get(high, 0) | chunk
+        return result
+
+    # The bitmap can replace the dict of RIDs of an index entry, every RID maps to None
+
+    def __setitem__(self, rid, included_values):
+        if included_values is not None:
+            raise Exception('A bitmap index cannot include column values')
+        self.add(rid)
+
+    def __delitem__(self, rid):
+        self.discard(rid)
+
+    def items(self):
+        return ((rid, None) for rid in self)
+
+
+class RidArray:
+    """
+    The base RIDs of an entry of a hash index in ascending order, packed in an array of unsigned 64-bit integers.
+    A RID takes 8 bytes instead of a dict slot, it is found by binary search and removing it shifts the larger RIDs.
+    """
+    __slots__ = ('rids',)
+
+    def __init__(self, rids=()):
+        self.rids = array('Q', sorted(rids))
+
+    def add(self, rid: int):
+        rids = self.rids
+        # A new base record has the largest RID
+        if len(rids) == 0 or rid > rids[-1]:
+            rids.append(rid)
+            return
+        position = bisect_left(rids, rid)
+        if rids[position] != rid:
+            rids.insert(position, rid)
+
+    def discard(self, rid: int):
+        rids = self.rids
+        position = bisect_left(rids, rid)
+        if position < len(rids) and rids[position] == rid:
+            del rids[position]
+
+    def update(self, rids):
+        for rid in rids:
+            self.add(rid)
+
+    def __contains__(self, rid):
+        position = bisect_left(self.rids, rid)
+        return position < len(self.rids) and self.rids[position] == rid
+
+    def __len__(self):
+        return len(self.rids)
+
+    def __iter__(self):
+        return iter(self.rids)
+
+    # Like a bitmap, the array can replace the dict of RIDs of an index entry
+
+    def __setitem__(self, rid, included_values):
+        if included_values is not None:
+            raise Exception('A RID array cannot include column values')
+        self.add(rid)
+
+    def __delitem__(self, rid):
+        self.discard(rid)
+
+    def items(self):
+        return ((rid, None) for rid in self.rids)
+
+
+class BitmapIndex(dict):
+    """
+    An equality index mapping every value of a column to the Bitmap of the base RIDs holding it.
+    """
+    pass
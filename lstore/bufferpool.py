@@ -0,0 +1,445 @@
+from collections import OrderedDict
+from threading import RLock
+
+from lstore.config import RECORDS_PER_PAGE, BUFFERPOOL_SIZE, BUFFERPOOL_MEMORY_BUDGET, BUFFERPOOL_REPLACEMENT_POLICY, PIN_COUNT_MAX, ENABLE_BUFFERPOOL_LOGGING, BACKGROUND_FLUSH
+from lstore.flusher import Flusher
+from lstore.page import Page, PAGE_MEMORY_SIZE
+from lstore.page_range import PageRange
+
+
+class LRUPolicy:
+    """
+    Evicts the least recently used unpinned page.
+    """
+
+    def __init__(self):
+        # Resident pages ordered from the least to the most recently used
+        self.pages: OrderedDict[Page, None] = OrderedDict()
+
+    def add(self, page: Page):
+        self.pages[page] = None
+
+    def access(self, page: Page):
+        self.pages.move_to_end(page)
+
+    def remove(self, page: Page):
+        del self.pages[page]
+
+    def victim(self):
+        for page in self.pages:
+            if page.pin_count == 0:
+                return page
+        return None
+
+
+class MRUPolicy(LRUPolicy):
+    """
+    Evicts the most recently used unpinned page, which suits repeated sequential scans larger than the pool.
+    """
+
+    def victim(self):
+        for page in reversed(self.pages):
+            if page.pin_count == 0:
+                return page
+        return None
+
+
+class ClockPolicy:
+    """
+    Approximates LRU with a reference bit per page and a clock hand sweeping over the frames.
+    """
+
+    def __init__(self):
+        # The frames in clock order
+        self.pages: list[Page | None] = []
+        # Maps every resident page to its position in the clock and its reference bit
+        self.positions: dict[Page, int] = {}
+        self.referenced: dict[Page, bool] = {}
+        # Positions of the clock left empty by removed pages
+        self.free_positions: list[int] = []
+        self.hand = 0
+
+    def add(self, page: Page):
+        if self.free_positions:
+            position = self.free_positions.pop()
+            self.pages[position] = page
+        else:
+            position = len(self.pages)
+            self.pages.append(page)
+        self.positions[page] = position
+        self.referenced[page] = True
+
+    def access(self, page: Page):
+        self.referenced[page] = True
+
+    def remove(self, page: Page):
+        position = self.positions.pop(page)
+        del self.referenced[page]
+        self.pages[position] = None
+        self.free_positions.append(position)
+
+    def victim(self):
+        # Two sweeps clear every reference bit, a third one only finds pinned pages
+        for _ in range(3 * len(self.pages)):
+            page = self.pages[self.hand]
+            self.hand = (self.hand + 1) % len(self.pages)
+            if page is None or page.pin_count > 0:
+                continue
+            if self.referenced[page]:
+                self.referenced[page] = False
+            else:
+                return page
+        return None
+
+
+REPLACEMENT_POLICIES = {
+    'LRU': LRUPolicy,
+    'MRU': MRUPolicy,
+    'CLOCK': ClockPolicy,
+}
+
+
+class BufferPool:
+    def __init__(self, memory_budget: int | None = BUFFERPOOL_MEMORY_BUDGET, policy: str = BUFFERPOOL_REPLACEMENT_POLICY):
+        """
+        Initialize a buffer pool of individual column pages shared by the tables of a database.
+
+        Args:
+            memory_budget (int | None, optional): The number of bytes the resident pages and page range layouts may use.
+                None leaves room for BUFFERPOOL_SIZE pages of PAGE_MEMORY_SIZE bytes. Defaults to BUFFERPOOL_MEMORY_BUDGET.
+            policy (str, optional): The page replacement policy, one of LRU, MRU or Clock. Defaults to BUFFERPOOL_REPLACEMENT_POLICY.
+        """
+        # The maximum number of bytes used by resident pages and page ranges
+        self.memory_budget = memory_budget if memory_budget is not None else BUFFERPOOL_SIZE * PAGE_MEMORY_SIZE
+        # The number of bytes currently used by resident pages and page ranges
+        self.memory_used = 0
+        # The replacement policy tracking the resident pages
+        self.policy = REPLACEMENT_POLICIES[policy.upper()]()
+        # Maps every resident page to its location and charged size: (table, page range, is tail, row, column, size)
+        self.frames: dict[Page, tuple] = {}
+        # Maps every loaded page range to the number of bytes charged for its page layout
+        self.page_range_sizes: dict[PageRange, int] = {}
+        # Page ranges whose last resident page was evicted, released at the start of the next operation
+        self.empty_page_ranges: dict[PageRange, object] = {}
+        # Writes evicted dirty pages in the background
+        self.flusher = Flusher()
+        # Guards the frames, the policy and the page ranges of the tables
+        self.lock = RLock()
+
+    def read_values(self, table, page_range_index: int, is_tail: bool, row: int, offset: int, columns):
+        """
+        Read the values of a record from several column pages while holding the buffer pool lock, which keeps the pages resident.
+
+        Args:
+            table (table.Table): The table the pages belong to.
+            page_range_index (int): The index of the page range the pages belong to.
+            is_tail (bool): Whether the pages are tail pages.
+            row (int): The index of the pages within the base or tail pages.
+            offset (int): The index of the record within the pages.
+            columns (Iterable[int]): The column indexes to read.
+
+        Returns:
+            list[int]: The values of the columns.
+        """
+        values = []
+        with self.lock:
+            page_range = self.get_page_range(table, page_range_index)
+            for column in columns:
+                values.append(self.access_page(table, page_range, is_tail, row, column).read(offset))
+        return values
+
+    def pin_page(self, table, page_range_index: int, is_tail: bool, row: int, column: int):
+        """
+        Get a page and pin it, so that it stays resident after the buffer pool lock is released.
+        Every pinned page must be released with unpin_page.
+
+        Args:
+            table (table.Table): The table the page belongs to.
+            page_range_index (int): The index of the page range the page belongs to.
+            is_tail (bool): Whether the page is a tail page.
+            row (int): The index of the page within the base or tail pages.
+            column (int): The column index.
+
+        Returns:
+            Page: The pinned page.
+        """
+        with self.lock:
+            page_range = self.get_page_range(table, page_range_index)
+            page = self.access_page(table, page_range, is_tail, row, column)
+            if page.pin_count >= PIN_COUNT_MAX:
+                raise Exception('Page pinned more than PIN_COUNT_MAX times')
+            page.pin_count += 1
+            return page
+
+    def unpin_page(self, page: Page):
+        """
+        Release a page obtained from pin_page.
+
+        Args:
+            page (Page): The pinned page.
+        """
+        with self.lock:
+            page.pin_count -= 1
+
+    def append_values(self, table, page_range_index: int, is_tail: bool, values):
+        """
+        Append a record to the last set of base or tail pages of a page range, creating a new set when it is full.
+
+        Args:
+            table (table.Table): The table the page range belongs to.
+            page_range_index (int): The index of the page range receiving the record.
+            is_tail (bool): Whether the record is a tail record.
+            values (Sequence[int]): The value of every column of the record.
+
+        Returns:
+            tuple: The index of the set of pages and the index of the record within the pages.
+        """
+        with self.lock:
+            page_range = self.get_page_range(table, page_range_index)
+            rows = page_range.tail_pages if is_tail else page_range.base_pages
+            row = len(rows) - 1
+            if row < 0 or page_range.get_num_records(row, is_tail) == RECORDS_PER_PAGE:
+                row = self.new_pages(table, page_range, is_tail)
+            for column, value in enumerate(values):
+                page = self.access_page(table, page_range, is_tail, row, column)
+                page.write(value)
+            if is_tail:
+                page_range.num_tail_records += 1
+            else:
+                page_range.num_base_records += 1
+            page_range.is_dirty = True
+            return row, page.num_records - 1
+
+    def append_many(self, table, page_range_index: int, is_tail: bool, columns):
+        """
+        Append many records to the last sets of base or tail pages of a page range, filling every page column by column
+        and creating new sets when they are full. The page range must have room for all the records.
+
+        Args:
+            table (table.Table): The table the page range belongs to.
+            page_range_index (int): The index of the page range receiving the records.
+            is_tail (bool): Whether the records are tail records.
+            columns (Sequence[Sequence[int]]): The values of the records column by column, for every column of the page range.
+        """
+        with self.lock:
+            page_range = self.get_page_range(table, page_range_index)
+            rows = page_range.tail_pages if is_tail else page_range.base_pages
+            count = len(columns[0])
+            appended = 0
+            while appended < count:
+                row = len(rows) - 1
+                if row < 0 or page_range.get_num_records(row, is_tail) == RECORDS_PER_PAGE:
+                    row = self.new_pages(table, page_range, is_tail)
+                for column, values in enumerate(columns):
+                    page = self.access_page(table, page_range, is_tail, row, column)
+                    num_appended = page.append_many(values[appended:appended + RECORDS_PER_PAGE])
+                appended += num_appended
+                if is_tail:
+                    page_range.num_tail_records += num_appended
+                else:
+                    page_range.num_base_records += num_appended
+            page_range.is_dirty = True
+
+    def write_value(self, table, page_range_index: int, is_tail: bool, row: int, offset: int, column: int, value: int):
+        """
+        Overwrite a value of an existing record.
+
+        Args:
+            table (table.Table): The table the page belongs to.
+            page_range_index (int): The index of the page range the page belongs to.
+            is_tail (bool): Whether the page is a tail page.
+            row (int): The index of the page within the base or tail pages.
+            offset (int): The index of the record within the page.
+            column (int): The column index.
+            value (int): The new value.
+        """
+        with self.lock:
+            page_range = self.get_page_range(table, page_range_index)
+            page = self.access_page(table, page_range, is_tail, row, column)
+            page.write(value, offset)
+
+    def new_pages(self, table, page_range: PageRange, is_tail: bool):
+        """
+        Append a new set of empty pages for all columns to a page range. The pages are dirty and unpinned.
+
+        Args:
+            table (table.Table): The table the page range belongs to.
+            page_range (PageRange): The page range receiving the pages.
+            is_tail (bool): Whether to create tail pages.
+
+        Returns:
+            int: The index of the new set of pages.
+        """
+        with self.lock:
+            row = page_range.create_page(is_tail)
+            self.charge_page_range(page_range)
+            for column in range(page_range.columns):
+                page = self.allocate_frame()
+                page.clear()
+                self.place_page(table, page_range, is_tail, row, column, page)
+            return row
+
+    def access_page(self, table, page_range: PageRange, is_tail: bool, row: int, column: int):
+        """
+        Get a page of a page range, reading it from disk if it is not resident, and record the access with the replacement policy.
+        The page stays resident while the caller holds the buffer pool lock.
+
+        Args:
+            table (table.Table): The table the page belongs to.
+            page_range (PageRange): The page range the page belongs to.
+            is_tail (bool): Whether the page is a tail page.
+            row (int): The index of the page within the base or tail pages.
+            column (int): The column index.
+
+        Returns:
+            Page: The resident page.
+        """
+        page = (page_range.tail_pages if is_tail else page_range.base_pages)[row][column]
+        if page is None:
+            return self.load_page(table, page_range, is_tail, row, column)
+        self.policy.access(page)
+        return page
+
+    def load_page(self, table, page_range: PageRange, is_tail: bool, row: int, column: int):
+        """
+        Read a page from disk into a frame of the buffer pool.
+
+        Args:
+            table (table.Table): The table the page belongs to.
+            page_range (PageRange): The page range the page belongs to.
+            is_tail (bool): Whether the page is a tail page.
+            row (int): The index of the page within the base or tail pages.
+            column (int): The column index.
+
+        Returns:
+            Page: The resident page.
+        """
+        page = self.allocate_frame()
+        # A page that was evicted but not written yet by the background writer is read from its queued contents
+        data = self.flusher.get_pending(table, page_range.index, is_tail, row, column)
+        table.read_page(page_range, is_tail, row, column, page, data)
+        self.place_page(table, page_range, is_tail, row, column, page)
+        return page
+
+    def place_page(self, table, page_range: PageRange, is_tail: bool, row: int, column: int, page: Page):
+        """
+        Make a page resident in its page range and charge its size to the memory budget.
+        """
+        (page_range.tail_pages if is_tail else page_range.base_pages)[row][column] = page
+        size = page.get_memory_size()
+        self.frames[page] = (table, page_range, is_tail, row, column, size)
+        self.memory_used += size
+        page_range.num_resident_pages += 1
+        self.empty_page_ranges.pop(page_range, None)
+        self.policy.add(page)
+
+    def allocate_frame(self):
+        """
+        Get a page object for a new frame, evicting pages until the new frame fits in the memory budget.
+        The frame of the last evicted page is reused. If every page is pinned the pool temporarily exceeds its budget.
+
+        Returns:
+            Page: A page object that is not resident in any page range.
+        """
+        frame = None
+        while self.memory_used + PAGE_MEMORY_SIZE > self.memory_budget:
+            victim = self.policy.victim()
+            if victim is None:
+                break
+            self.evict(victim)
+            frame = victim
+        return frame if frame is not None else Page()
+
+    def evict(self, page: Page, write_back: bool = True):
+        """
+        Remove a page from the buffer pool, writing it to disk first if it is dirty.
+        With BACKGROUND_FLUSH a copy of the page is queued for the background writer instead.
+
+        Args:
+            page (Page): The unpinned page to evict.
+            write_back (bool, optional): Whether to write the page if it is dirty. Defaults to True.
+        """
+        table, page_range, is_tail, row, column, size = self.frames.pop(page)
+        self.policy.remove(page)
+        if ENABLE_BUFFERPOOL_LOGGING:
+            print(f'Evicting {"tail" if is_tail else "base"} page {row} of column {column} in page range {page_range.index} of {table.name}')
+        if write_back and page.is_dirty:
+            if BACKGROUND_FLUSH:
+                data = table.serialize_page(page_range, is_tail, row, column, page)
+                self.flusher.write_page(table, page_range.index, is_tail, row, column, data)
+                page.is_dirty = False
+            else:
+                table.write_page(page_range, is_tail, row, column, page)
+        (page_range.tail_pages if is_tail else page_range.base_pages)[row][column] = None
+        self.memory_used -= size
+        page_range.num_resident_pages -= 1
+        if page_range.num_resident_pages == 0:
+            self.empty_page_ranges[page_range] = table
+
+    def get_page_range(self, table, page_range_index: int):
+        """
+        Get a page range of a table after releasing the page ranges left without resident pages.
+        Page ranges are only released here, so a page range returned while holding the lock stays valid until it is released.
+
+        Args:
+            table (table.Table): The table the page range belongs to.
+            page_range_index (int): The index of the page range.
+
+        Returns:
+            PageRange: The page range object.
+        """
+        if self.empty_page_ranges:
+            self.release_empty_page_ranges()
+        return table.get_page_range(page_range_index)
+
+    def register_page_range(self, page_range: PageRange):
+        """
+        Charge the page layout of a newly loaded page range to the memory budget.
+
+        Args:
+            page_range (PageRange): The loaded page range.
+        """
+        with self.lock:
+            self.page_range_sizes[page_range] = 0
+            self.charge_page_range(page_range)
+
+    def charge_page_range(self, page_range: PageRange):
+        """
+        Update the number of bytes charged for the page layout of a page range after it grew.
+        """
+        size = page_range.get_memory_size()
+        self.memory_used += size - self.page_range_sizes[page_range]
+        self.page_range_sizes[page_range] = size
+
+    def release_empty_page_ranges(self):
+        """
+        Write the headers of the page ranges without resident pages and drop them from their tables.
+        """
+        with self.lock:
+            for page_range, table in self.empty_page_ranges.items():
+                if page_range.num_resident_pages != 0:
+                    continue
+                if page_range.is_dirty:
+                    table.write_page_range(table.get_page_range_file(page_range.index), page_range)
+                self.memory_used -= self.page_range_sizes.pop(page_range)
+                page_range.mappings.clear()
+                del table.page_ranges[page_range.index]
+            self.empty_page_ranges.clear()
+
+    def evict_table(self, table, write_back: bool = True):
+        """
+        Remove all pages of a table from the buffer pool and release its page ranges.
+
+        Args:
+            table (table.Table): The table whose pages are removed.
+            write_back (bool, optional): Whether to write dirty pages and page range headers to disk. Defaults to True.
+        """
+        with self.lock:
+            for page, frame in list(self.frames.items()):
+                if frame[0] is table:
+                    self.evict(page, write_back)
+            for page_range in table.page_ranges.values():
+                if not write_back:
+                    page_range.is_dirty = False
+                self.empty_page_ranges[page_range] = table
+            self.release_empty_page_ranges()
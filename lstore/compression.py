@@ -0,0 +1,135 @@
+"""
+Encodings of base pages on disk. Every page is stored with the smallest of the encodings below,
+only the num_records values of the page are encoded and the rest of the page decodes to zeros.
+"""
+from lstore.config import PAGE_SIZE, RECORD_SIZE
+
+RAW = 0  # The PAGE_SIZE bytes of the page
+RLE = 1  # Runs of equal values: value and run length
+DELTA = 2  # First value, then the differences between consecutive values bit-packed relative to the smallest difference
+FOR = 3  # Frame of reference: the smallest value, then the offsets from it bit-packed
+
+RUN_LENGTH_SIZE = 2  # Bytes storing the length of a run, a page holds at most 512 values
+DELTA_REFERENCE_SIZE = RECORD_SIZE + 1  # Bytes storing the smallest difference, which is signed and may need 65 bits
+
+
+def pack_bits(values: list[int], width: int):
+    """
+    Pack non-negative integers into width bits each.
+    """
+    if width == 0:
+        return b''
+    packed = 0
+    for i, value in enumerate(values):
+        packed |= value << (i * width)
+    return packed.to_bytes((len(values) * width + 7) // 8, 'little')
+
+
+def unpack_bits(data, count: int, width: int):
+    """
+    Unpack count integers of width bits each.
+    """
+    if width == 0:
+        return [0] * count
+    packed = int.from_bytes(data, 'little')
+    mask = (1 << width) - 1
+    return [(packed >> (i * width)) & mask for i in range(count)]
+
+
+def encode_rle(values: list[int]):
+    data = bytearray()
+    start = 0
+    for i in range(1, len(values) + 1):
+        if i == len(values) or values[i] != values[start]:
+            data += values[start].to_bytes(RECORD_SIZE, 'little')
+            data += (i - start).to_bytes(RUN_LENGTH_SIZE, 'little')
+            start = i
+    return bytes(data)
+
+
+def decode_rle(data):
+    values = []
+    for offset in range(0, len(data), RECORD_SIZE + RUN_LENGTH_SIZE):
+        value = int.from_bytes(data[offset:offset + RECORD_SIZE], 'little')
+        length = int.from_bytes(data[offset + RECORD_SIZE:offset + RECORD_SIZE + RUN_LENGTH_SIZE], 'little')
+        values.extend([value] * length)
+    return values
+
+
+def encode_for(values: list[int]):
+    reference = min(values)
+    offsets = [value - reference for value in values]
+    width = max(offsets).bit_length()
+    return reference.to_bytes(RECORD_SIZE, 'little') + bytes([width]) + pack_bits(offsets, width)
+
+
+def decode_for(data, count: int):
+    reference = int.from_bytes(data[:RECORD_SIZE], 'little')
+    width = data[RECORD_SIZE]
+    return [reference + offset for offset in unpack_bits(data[RECORD_SIZE + 1:], count, width)]
+
+
+def encode_delta(values: list[int]):
+    deltas = [values[i] - values[i - 1] for i in range(1, len(values))]
+    reference = min(deltas)
+    offsets = [delta - reference for delta in deltas]
+    width = max(offsets).bit_length()
+    return (values[0].to_bytes(RECORD_SIZE, 'little') + reference.to_bytes(DELTA_REFERENCE_SIZE, 'little', signed=True)
+            + bytes([width]) + pack_bits(offsets, width))
+
+
+def decode_delta(data, count: int):
+    value = int.from_bytes(data[:RECORD_SIZE], 'little')
+    reference = int.from_bytes(data[RECORD_SIZE:RECORD_SIZE + DELTA_REFERENCE_SIZE], 'little', signed=True)
+    width = data[RECORD_SIZE + DELTA_REFERENCE_SIZE]
+    values = [value]
+    for offset in unpack_bits(data[RECORD_SIZE + DELTA_REFERENCE_SIZE + 1:], count - 1, width):
+        value += reference + offset
+        values.append(value)
+    return values
+
+
+def encode_page(values: list[int]):
+    """
+    Encode the values of a page with the encoding producing the fewest bytes.
+
+    Args:
+        values (list[int]): The num_records values of the page.
+
+    Returns:
+        tuple: The encoding and the encoded bytes, RAW with None when no encoding is smaller than the page.
+    """
+    if len(values) == 0:
+        return RLE, b''
+    best_encoding, best_data = RAW, None
+    candidates = [(RLE, encode_rle), (FOR, encode_for)]
+    if len(values) > 1:
+        candidates.append((DELTA, encode_delta))
+    for encoding, encode in candidates:
+        data = encode(values)
+        if len(data) < PAGE_SIZE and (best_data is None or len(data) < len(best_data)):
+            best_encoding, best_data = encoding, data
+    return best_encoding, best_data
+
+
+def decode_page(encoding: int, data, count: int):
+    """
+    Decode the values of a page.
+
+    Args:
+        encoding (int): The encoding of the page, one of RLE, DELTA or FOR.
+        data (bytes | memoryview): The encoded bytes.
+        count (int): The number of values of the page.
+
+    Returns:
+        list[int]: The values of the page.
+    """
+    if count == 0:
+        return []
+    if encoding == RLE:
+        return decode_rle(data)
+    if encoding == DELTA:
+        return decode_delta(data, count)
+    if encoding == FOR:
+        return decode_for(data, count)
+    raise Exception(f'Unknown page encoding {encoding}')
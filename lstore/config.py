@@ -10,17 +10,36 @@ PAGE_SIZE = 4096  # Size of each page in bytes
 RECORD_SIZE = 8  # Size of each record in bytes (64-bit integers)
 RECORDS_PER_PAGE = PAGE_SIZE // RECORD_SIZE  # Number of records per page
 BASE_PAGES_PER_RANGE = 16  # Number of base pages per range
+MAX_VALUE = 2 ** 64 - 1  # Marks a missing indirection and a deleted record
+FIRST_BASE_RID = 92106429  # RID of the first base record, smaller RIDs are tail records numbered from 0
+INSERT_BATCH_SIZE = RECORDS_PER_PAGE * BASE_PAGES_PER_RANGE  # Number of records loaded at a time by Query.load_csv, one page range
+AGGREGATE_BATCH_SIZE = RECORDS_PER_PAGE * BASE_PAGES_PER_RANGE  # Number of records reduced at a time by Query.aggregate, one page range
 
 # Bufferpool configuration
 BUFFERPOOL_SIZE = 1000  # Number of pages in bufferpool
-BUFFERPOOL_REPLACEMENT_POLICY = 'LRU'  # Page replacement policy (LRU/MRU)
+BUFFERPOOL_MEMORY_BUDGET = None  # Bytes of resident pages and page ranges per database, None for BUFFERPOOL_SIZE pages of the measured page memory size
+BUFFERPOOL_REPLACEMENT_POLICY = 'LRU'  # Page replacement policy (LRU/MRU/Clock)
 PIN_COUNT_MAX = 100  # Maximum number of pins per page
 ENABLE_BUFFERPOOL_LOGGING = False  # Enable logging of bufferpool operations
+BACKGROUND_FLUSH = True  # Write evicted dirty pages from a background thread
+FLUSHER_QUEUE_SIZE = 256  # Maximum number of evicted pages waiting to be written before evictions block
 
 # Page range configuration
 MAX_BASE_PAGES = 16  # Maximum number of base pages per page range
+PAGE_RANGE_MMAP = False  # Map column files into memory instead of reading them into each page, every mapped file keeps a file descriptor open while a resident page views it
+PAGE_COMPRESSION = False  # Store base pages with the smallest encoding of lstore.compression on disk
+
+# Index configuration
+INDEX_LATCH_STRIPES = 16  # Number of latches of an index, the entries of different values hashed to different latches are read and written concurrently
+INDEX_SCAN_BATCH = 256  # Number of values of a BTree read at a time by a range scan
 
 # Merge configuration
 MERGE_TRIGGER_COUNT = 2000  # Number of updates before triggering merge
 MERGE_THRESHOLD = 0.2  # Percentage of records that need to be updated to trigger merge
 
+# Query planner configuration
+HISTOGRAM_BUCKETS = 32  # Number of buckets of the value histogram of a column
+RECORD_READ_COST = 1.0  # Estimated cost of reading the latest version of a record by RID
+INDEX_ENTRY_COST = 0.01  # Estimated cost of visiting one RID, or one bitmap chunk, of an index entry
+SCAN_VALUE_COST = 0.05  # Estimated cost of reading one value of a column during a page-wise scan
+DEFAULT_SELECTIVITY = 0.1  # Fraction of the records assumed to match an equality on a column without statistics
@@ -1,15 +1,18 @@
 import os
 
 from lstore.table import Table
+from lstore.bufferpool import BufferPool
 from lstore.util import eight_bytes_to_int, int_to_8_bytes
-from lstore.config import RECORD_SIZE
+from lstore.config import RECORD_SIZE, BUFFERPOOL_MEMORY_BUDGET
 
 
 class Database:
 
-    def __init__(self):
+    def __init__(self, memory_budget: int | None = BUFFERPOOL_MEMORY_BUDGET):
         self.tables: list[Table] = []
         self.database_directory = ''
+        # The buffer pool shared by all tables of the database, holding at most memory_budget bytes of pages
+        self.bufferpool = BufferPool(memory_budget)
 
     # Not required for milestone1
     def open(self, path):
@@ -68,7 +71,7 @@ class Database:
     """
 
     def create_table(self, name, num_columns, key_index):
-        table = Table(name, num_columns, key_index, self.database_directory)
+        table = Table(name, num_columns, key_index, self.database_directory, self.bufferpool)
         self.tables.append(table)
         return table
 
@@ -77,6 +80,9 @@ class Database:
     """
 
     def drop_table(self, name):
+        for table in self.tables:
+            if table.name == name:
+                self.bufferpool.evict_table(table, False)
         self.tables = [table for table in self.tables if table.name != name]
 
     """
@@ -0,0 +1,83 @@
+from queue import Queue
+from threading import Lock, Thread
+
+from lstore.config import FLUSHER_QUEUE_SIZE
+
+
+class Flusher:
+    def __init__(self, queue_size: int = FLUSHER_QUEUE_SIZE):
+        """
+        Initialize a background writer for pages evicted from the buffer pool.
+
+        Args:
+            queue_size (int, optional): The maximum number of pages waiting to be written, evicting more blocks until the writer catches up. Defaults to FLUSHER_QUEUE_SIZE.
+        """
+        # Pages waiting to be written: (key, data)
+        self.queue: Queue = Queue(queue_size)
+        # Maps the location of every page waiting to be written to its latest contents: (table, page range index, is tail, row, column)
+        self.pending: dict[tuple, bytes] = {}
+        # Guards pending
+        self.lock = Lock()
+        # The writer thread, started on the first write
+        self.thread: Thread | None = None
+        # The first error raised by the writer thread, reported by flush
+        self.error: Exception | None = None
+
+    def write_page(self, table, page_range_index: int, is_tail: bool, row: int, column: int, data: bytes):
+        """
+        Queue a page to be written by the writer thread, blocking while the queue is full.
+
+        Args:
+            table (table.Table): The table the page belongs to.
+            page_range_index (int): The index of the page range the page belongs to.
+            is_tail (bool): Whether the page is a tail page.
+            row (int): The index of the page within the base or tail pages.
+            column (int): The column index.
+            data (bytes): A copy of the contents of the page.
+        """
+        key = (table, page_range_index, is_tail, row, column)
+        with self.lock:
+            self.pending[key] = data
+            if self.thread is None:
+                self.thread = Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.queue.put((key, data))
+
+    def get_pending(self, table, page_range_index: int, is_tail: bool, row: int, column: int):
+        """
+        Get the contents of a page that is queued but not written yet.
+
+        Returns:
+            bytes | None: The latest queued contents of the page, None if the page is not waiting to be written.
+        """
+        with self.lock:
+            return self.pending.get((table, page_range_index, is_tail, row, column))
+
+    def flush(self):
+        """
+        Wait until every queued page is written.
+
+        Raises:
+            Exception: The first error raised while writing a page.
+        """
+        self.queue.join()
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def run(self):
+        while True:
+            key, data = self.queue.get()
+            try:
+                table, page_range_index, is_tail, row, column = key
+                table.write_page_data(page_range_index, is_tail, row, column, data)
+            except Exception as e:
+                if self.error is None:
+                    self.error = e
+            finally:
+                with self.lock:
+                    # A newer copy of the page may have been queued in the meantime
+                    if self.pending.get(key) is data:
+                        del self.pending[key]
+                self.queue.task_done()
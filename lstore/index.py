@@ -1,59 +1,640 @@
 """
 A data strucutre holding indices for various columns of a table. Key column should be indexd by default, other columns can be indexed through this object. Indices are usually B-Trees, but other data structures can be used as well.
 """
+import os
+from array import array
+from collections import Counter
+from functools import reduce
+from itertools import groupby, islice, repeat
+from operator import and_, itemgetter
+from threading import Lock, Thread
+
 from BTrees.OOBTree import OOBTree
 
+from lstore.bitmap import Bitmap, BitmapIndex, RidArray
+from lstore.config import INDEX_LATCH_STRIPES, INDEX_SCAN_BATCH
+from lstore.statistics import ColumnStatistics
+
+# The kinds of index: a BTree supports range scans, a hash table only supports equality lookups but finds a value in constant time,
+# a bitmap index keeps a compressed bitmap of RIDs per value, which suits columns with few distinct values and intersects quickly
+INDEX_KINDS = ('btree', 'hash', 'bitmap')
+# The first words of an index file, files written in another format are rejected by read_indices
+INDEX_FILE_MAGIC = int.from_bytes(b'LSTOREIX', 'little')
+INDEX_FORMAT_VERSION = 2
+
+
+def get_index_key(column):
+    """
+    Get the key identifying the index of one or several columns.
+
+    Args:
+        column (int | Sequence[int]): A column index, or the column indexes of a composite index.
+
+    Returns:
+        int | tuple[int, ...]: The column index for a single column, the tuple of column indexes otherwise.
+    """
+    if isinstance(column, int):
+        return column
+    columns = tuple(column)
+    return columns[0] if len(columns) == 1 else columns
+
+
+def create_tree(kind):
+    """
+    Create the empty tree of an index.
+
+    Args:
+        kind (str): One of INDEX_KINDS.
+
+    Returns:
+        OOBTree | dict | BitmapIndex: The tree.
+    """
+    if kind == 'bitmap':
+        return BitmapIndex()
+    if kind == 'hash':
+        return {}
+    return OOBTree()
+
+
+def get_index_kind(tree):
+    """
+    Get the kind of the tree of an index.
+
+    Returns:
+        str: One of INDEX_KINDS.
+    """
+    if isinstance(tree, BitmapIndex):
+        return 'bitmap'
+    if isinstance(tree, dict):
+        return 'hash'
+    return 'btree'
+
+
+def get_key_columns(index_key):
+    """
+    Get the indexed columns of an index.
+
+    Returns:
+        tuple[int, ...]: The column indexes whose values form the keys of the index.
+    """
+    return (index_key,) if isinstance(index_key, int) else index_key
+
+
+class IndexLatches:
+    """
+    The latches of one index, so that readers and writers of different values of the index do not wait for each other.
+    A stripe latch guards the entries of the values hashed to it, the tree latch guards adding and removing values of the tree.
+    A thread holding the tree latch never waits for a stripe latch.
+    """
+
+    def __init__(self, num_stripes: int = INDEX_LATCH_STRIPES):
+        self.tree = Lock()
+        self.stripes = [Lock() for _ in range(num_stripes)]
+
+    def stripe(self, value):
+        return self.stripes[hash(value) % len(self.stripes)]
+
 
 class Index:
 
     def __init__(self, table):
         # One index for each table. All our empty initially.
-        self.indices: list[OOBTree | None] = [None] * table.num_columns
+        # Every tree maps a value to the base RIDs of the records whose latest version holds it,
+        # kept as the keys of a dict so that they stay in insertion order and are removed in constant time.
+        # A hash index is a plain dict instead of an OOBTree, its entries without included values are compact RidArrays.
+        self.indices: list[OOBTree | dict | None] = [None] * table.num_columns
+        # The indices on several columns by their tuple of columns, their values are tuples of the column values
+        self.composite_indices: dict[tuple[int, ...], OOBTree | dict] = {}
+        # The columns included in the entries of covering indices by index key,
+        # the tree then maps every RID to the tuple of its included values instead of None
+        self.included: dict[int | tuple[int, ...], tuple[int, ...]] = {}
         self.table = table
+        # The changes logged for every index being built: (is insert, value, base RID, included values)
+        self.building: dict[int | tuple[int, ...], list[tuple]] = {}
+        # The threads building indices in the background
+        self.builders: dict[int | tuple[int, ...], Thread] = {}
+        # Guards building and the publication of built indices
+        self.lock = Lock()
+        # The latches of every index by index key, kept when the index is dropped so that running readers can still use them
+        self.latches: dict[int | tuple[int, ...], IndexLatches] = {}
+        # The value statistics of the columns that are indexed or were analyzed, kept up to date by every write.
+        # Concurrent inserts and updates may miscount slightly, the statistics are only estimates
+        self.statistics: dict[int, ColumnStatistics] = {}
 
     """
     # returns the location of all records with the given value on column "column"
+    # column may be a tuple of columns with a composite index, value is then the tuple of their values
     """
 
     def locate(self, column, value):
-        if value in self.indices[column]:
-            return self.indices[column][value]
-        return []
+        return self.read_entry(get_index_key(column), value, list) or []
+
+    """
+    # Returns the RIDs of the records with the given value together with the values of the columns included in the index
+    """
+
+    def locate_covered(self, column, value):
+        return self.read_entry(get_index_key(column), value, lambda rids: list(rids.items())) or []
 
     """
-    # Returns the RIDs of all records with values in column "column" between "begin" and "end"
+    # Returns the RIDs of all records with values in column "column" between "begin" and "end", both included
     """
 
     def locate_range(self, begin, end, column):
-        rids = []
-        tree = self.indices[column]
-        for values in list(tree.values[begin:end]):
-            rids.extend(values)
-        return rids
+        return list(self.scan_range(column, begin, end))
+
+    """
+    # Yields the RIDs of the records with values in column "column" between "begin" and "end" in value order, reading the tree lazily
+    # A bound of None leaves that side unbounded, begin_inclusive and end_inclusive choose whether records equal to the bounds are included
+    # descending yields the largest values first, limit stops after that many RIDs
+    # The values are read INDEX_SCAN_BATCH at a time under the tree latch, so the index may be modified while the scan is running
+    """
+
+    def scan_range(self, column, begin=None, end=None, begin_inclusive=True, end_inclusive=True, descending=False, limit=None):
+        index_key = get_index_key(column)
+        tree = self.get_tree(index_key)
+        if tree is None or limit == 0:
+            return
+        if isinstance(tree, dict):
+            raise Exception(f'The {get_index_kind(tree)} index of column {column} does not support range scans')
+        latches = self.get_latches(index_key)
+        low_excluded, high_excluded = not begin_inclusive, not end_inclusive
+        count = 0
+        while True:
+            with latches.tree:
+                # Without a bound the BTree would exclude its first or last value instead
+                values = tree.keys(begin, end, excludemin=begin is not None and low_excluded, excludemax=end is not None and high_excluded)
+                batch = list(islice(reversed(values) if descending else values, INDEX_SCAN_BATCH))
+            for value in batch:
+                with latches.stripe(value):
+                    rids = tree.get(value)
+                    rids = list(rids) if rids is not None else []
+                for rid in (reversed(rids) if descending else rids):
+                    yield rid
+                    count += 1
+                    if count == limit:
+                        return
+            if len(batch) < INDEX_SCAN_BATCH:
+                return
+            # The next batch starts after the last value read
+            if descending:
+                end, high_excluded = batch[-1], True
+            else:
+                begin, low_excluded = batch[-1], True
+
+    """
+    # Returns the base RIDs of the records matching every value of "values" on the columns of "columns" in ascending order,
+    # intersecting the bitmaps of the indices of the columns
+    # Returns None if one of the columns is not indexed
+    """
+
+    def locate_all(self, columns, values):
+        bitmaps = []
+        for column, value in zip(columns, values):
+            index_key = get_index_key(column)
+            if self.get_tree(index_key) is None:
+                return None
+            rids = self.read_entry(index_key, value, lambda rids: rids.copy() if isinstance(rids, Bitmap) else Bitmap(rids))
+            if rids is None:
+                return []
+            bitmaps.append(rids)
+        return list(reduce(and_, bitmaps))
+
+    """
+    # Returns the number of records with the given value on column "column" and the number of RIDs, or of bitmap chunks,
+    # visited to read them from the index, None if the column is not indexed
+    """
+
+    def estimate(self, column, value):
+        index_key = get_index_key(column)
+        if self.get_tree(index_key) is None:
+            return None
+        estimate = self.read_entry(index_key, value, lambda rids: (len(rids), len(rids.chunks) if isinstance(rids, Bitmap) else len(rids)))
+        return estimate if estimate is not None else (0, 0)
+
+    """
+    # Returns the estimated number of records with the given value on column "column" from its index or its statistics,
+    # None if the column has neither
+    """
+
+    def estimate_rows(self, column, value):
+        estimate = self.estimate(column, value)
+        if estimate is not None:
+            return estimate[0]
+        statistics = self.statistics.get(column)
+        if statistics is not None:
+            return statistics.estimate_equal(value)
+        return None
+
+    """
+    # Collects the value statistics of column "column" from a scan of the table, they are then kept up to date by every write
+    # Writers are blocked during the scan
+    """
+
+    def analyze(self, column_number):
+        with self.table.insert_lock, self.table.update_lock:
+            counts = Counter()
+            for _, (values,) in self.table.scan_pages((column_number,)):
+                counts.update(values.tolist())
+            self.statistics[column_number] = ColumnStatistics(sorted(counts.items()))
+
+    """
+    # Returns whether column "column", or the tuple of columns of a composite index, is indexed
+    """
+
+    def has_index(self, column):
+        return self.get_tree(get_index_key(column)) is not None
+
+    """
+    # Returns whether the index of column "column" holds the values of all the given columns, so that a query can be answered from the index alone
+    """
+
+    def covers(self, column, columns):
+        index_key = get_index_key(column)
+        if self.get_tree(index_key) is None:
+            return False
+        available = get_key_columns(index_key) + self.included.get(index_key, ())
+        return all(column_number in available for column_number in columns)
 
     """
     # optional: Create index on specific column
+    # column_number may be a sequence of columns for a composite index, its values are the tuples of the values of the columns
+    # include lists columns whose values are stored in the index entries, so queries projecting only them do not read the records
+    # The index is built from a scan of the latest values of the table, and it is only used by queries once it is complete
+    # With background=True the index is built by a thread, wait_for_index blocks until it is ready
+    # kind is 'btree' for an index supporting range scans, 'hash' for an equality-only index
+    # or 'bitmap' for an equality-only index of a column with few distinct values, which cannot include columns
+    """
+
+    def create_index(self, column_number, background=False, kind='btree', include=()):
+        if kind not in INDEX_KINDS:
+            raise Exception(f'Unknown index kind {kind}')
+        if kind == 'bitmap' and len(include) > 0:
+            raise Exception('A bitmap index cannot include column values')
+        index_key = get_index_key(column_number)
+        # Writers hold these locks while writing a record, so every record was either written before the scan or its change is logged.
+        # An insert indexes its record after releasing the insert lock, it may log a record that was also scanned, replaying it changes nothing
+        with self.table.insert_lock, self.table.update_lock:
+            if self.get_tree(index_key) is not None or index_key in self.building:
+                return
+            if len(include) > 0:
+                self.included[index_key] = tuple(include)
+            self.building[index_key] = []
+        if background:
+            builder = Thread(target=self.build_index, args=(index_key, kind), daemon=True)
+            self.builders[index_key] = builder
+            builder.start()
+        else:
+            self.build_index(index_key, kind)
+
+    """
+    # Builds the tree of an index from a scan of the table, then applies the changes logged during the scan
+    # A BTree is filled in sorted order
+    """
+
+    def build_index(self, index_key, kind='btree'):
+        try:
+            key_columns = get_key_columns(index_key)
+            scanned_columns = key_columns + self.included.get(index_key, ())
+            entries = []
+            for rids, latest in self.table.scan_pages(scanned_columns):
+                latest = [values.tolist() for values in latest]
+                values = latest[0] if isinstance(index_key, int) else zip(*latest[:len(key_columns)])
+                included = zip(*latest[len(key_columns):]) if index_key in self.included else repeat(None)
+                entries.extend(zip(rids.tolist(), values, included))
+            latches = self.get_latches(index_key)
+            if kind != 'btree':
+                tree = create_tree(kind)
+                for rid, value, included_values in entries:
+                    self.insert_value(tree, latches, value, rid, included_values)
+            else:
+                entries.sort(key=itemgetter(1))
+                tree = OOBTree()
+                for value, group in groupby(entries, key=itemgetter(1)):
+                    tree[value] = {rid: included_values for rid, _, included_values in group}
+            with self.lock:
+                # The index was dropped while it was being built
+                if index_key not in self.building:
+                    return
+                for is_insert, value, rid, included_values in self.building[index_key]:
+                    if is_insert:
+                        self.insert_value(tree, latches, value, rid, included_values)
+                    else:
+                        self.delete_value(tree, latches, value, rid)
+                self.set_tree(index_key, tree)
+                if isinstance(index_key, int):
+                    self.statistics[index_key] = self.get_statistics(tree)
+                # Writers log their changes until the index leaves building, which must happen before the lock is released
+                self.building.pop(index_key, None)
+        finally:
+            with self.lock:
+                self.building.pop(index_key, None)
+                self.builders.pop(index_key, None)
+
+    """
+    # Waits until the index of a column, or of every column when column_number is None, is built
     """
 
-    def create_index(self, column_number):
-        if self.indices[column_number] is None:
-            self.indices[column_number] = OOBTree()
+    def wait_for_index(self, column_number=None):
+        builders = list(self.builders.values()) if column_number is None else [self.builders.get(get_index_key(column_number))]
+        for builder in builders:
+            if builder is not None:
+                builder.join()
 
     """
     # optional: Drop index of specific column
     """
 
     def drop_index(self, column_number):
-        self.indices[column_number] = None
+        index_key = get_index_key(column_number)
+        with self.lock:
+            self.building.pop(index_key, None)
+            self.set_tree(index_key, None)
+            self.included.pop(index_key, None)
+
+    """
+    # Writes every built index to a file in the table directory and removes the files of the indices that were dropped
+    # A file holds INDEX_FILE_MAGIC, INDEX_FORMAT_VERSION, the kind of the index, its columns and its included columns,
+    # then the values, each followed by its number of base RIDs and the RIDs with their included values
+    """
+
+    def write_indices(self, table_directory):
+        index_files = set()
+        for index_key in self.get_index_keys():
+            tree = self.get_tree(index_key)
+            if tree is None:
+                continue
+            key_columns = get_key_columns(index_key)
+            included_columns = self.included.get(index_key, ())
+            index_file = '_'.join(str(column_number) for column_number in key_columns) + '.index'
+            index_files.add(index_file)
+            data = array('Q', [INDEX_FILE_MAGIC, INDEX_FORMAT_VERSION, INDEX_KINDS.index(get_index_kind(tree)),
+                               len(key_columns), *key_columns, len(included_columns), *included_columns])
+            for value, rids in tree.items():
+                if isinstance(index_key, int):
+                    data.append(value)
+                else:
+                    data.extend(value)
+                data.append(len(rids))
+                if isinstance(rids, RidArray):
+                    data.extend(rids.rids)
+                    continue
+                if len(included_columns) == 0:
+                    data.extend(rids)
+                    continue
+                for rid, included_values in rids.items():
+                    data.append(rid)
+                    data.extend(included_values)
+            with open(os.path.join(table_directory, index_file), 'wb') as f:
+                data.tofile(f)
+        for file in os.listdir(table_directory):
+            if file.endswith('.index') and file not in index_files:
+                os.remove(os.path.join(table_directory, file))
+
+    """
+    # Loads the indices written by write_indices, the values of a BTree are read in sorted order so it is filled from left to right
+    # Raises an exception for a file written in another format
+    """
+
+    def read_indices(self, table_directory):
+        for file in os.listdir(table_directory):
+            if not file.endswith('.index'):
+                continue
+            data = array('Q')
+            with open(os.path.join(table_directory, file), 'rb') as f:
+                data.frombytes(f.read())
+            if len(data) < 2 or data[0] != INDEX_FILE_MAGIC or data[1] != INDEX_FORMAT_VERSION:
+                raise Exception(f'The index file {file} was not written in index format version {INDEX_FORMAT_VERSION}')
+            kind = INDEX_KINDS[data[2]]
+            num_key_columns = data[3]
+            key_columns = tuple(data[4:4 + num_key_columns])
+            num_included_columns = data[4 + num_key_columns]
+            offset = 5 + num_key_columns
+            included_columns = tuple(data[offset:offset + num_included_columns])
+            offset += num_included_columns
+            index_key = get_index_key(key_columns)
+            tree = create_tree(kind)
+            width = 1 + num_included_columns
+            while offset < len(data):
+                value = data[offset] if num_key_columns == 1 else tuple(data[offset:offset + num_key_columns])
+                offset += num_key_columns
+                count = data[offset]
+                offset += 1
+                if kind == 'bitmap':
+                    tree[value] = Bitmap(data[offset:offset + count])
+                elif kind == 'hash' and num_included_columns == 0:
+                    tree[value] = RidArray(data[offset:offset + count])
+                elif num_included_columns == 0:
+                    tree[value] = dict.fromkeys(data[offset:offset + count])
+                else:
+                    tree[value] = {data[entry]: tuple(data[entry + 1:entry + width]) for entry in range(offset, offset + count * width, width)}
+                offset += count * width
+            if num_included_columns > 0:
+                self.included[index_key] = included_columns
+            self.set_tree(index_key, tree)
+            if isinstance(index_key, int):
+                self.statistics[index_key] = self.get_statistics(tree)
 
     def push_index(self, columns, rid):
-        for column_number in range(self.table.num_columns):
-            if column_number == self.table.key:
+        for index_key in self.get_index_keys():
+            self.add_value(index_key, self.get_value(index_key, columns), rid, self.get_included_values(index_key, columns))
+        for column_number, statistics in list(self.statistics.items()):
+            statistics.add(columns[column_number])
+
+    """
+    # Adds many base records to the indices, every index is updated once per distinct value
+    # columns holds the values of the records column by column
+    """
+
+    def push_many(self, columns, rids):
+        for index_key in self.get_index_keys():
+            key_columns = get_key_columns(index_key)
+            values = columns[index_key] if isinstance(index_key, int) else zip(*(columns[column_number] for column_number in key_columns))
+            included_columns = self.included.get(index_key)
+            included = zip(*(columns[column_number] for column_number in included_columns)) if included_columns is not None else repeat(None)
+            entries = {}
+            for value, rid, included_values in zip(values, rids, included):
+                entries.setdefault(value, {})[rid] = included_values
+            for value, value_entries in entries.items():
+                self.add_entries(index_key, value, value_entries)
+        for column_number, statistics in list(self.statistics.items()):
+            for value in columns[column_number]:
+                statistics.add(value)
+
+    """
+    # Moves the base RID of an updated record from its old to its new value in every index on an updated column,
+    # and refreshes the included values of the covering indices
+    # old_columns holds the latest values before the update, new_columns holds None for the columns that were not updated
+    """
+
+    def update_index(self, rid, old_columns, new_columns):
+        new_columns = [old_value if new_value is None else new_value for old_value, new_value in zip(old_columns, new_columns)]
+        # The key of a record is never updated
+        new_columns[self.table.key] = old_columns[self.table.key]
+        for index_key in self.get_index_keys():
+            columns = get_key_columns(index_key) + self.included.get(index_key, ())
+            if all(old_columns[column_number] == new_columns[column_number] for column_number in columns):
                 continue
-            if self.indices[column_number] is None:
-                self.create_index(column_number)
-            tree = self.indices[column_number]
-            if columns[column_number] not in tree:
-                tree[columns[column_number]] = [rid]
-            else:
-                tree[columns[column_number]].append(rid)
+            self.remove_value(index_key, self.get_value(index_key, old_columns), rid)
+            self.add_value(index_key, self.get_value(index_key, new_columns), rid, self.get_included_values(index_key, new_columns))
+        for column_number, statistics in list(self.statistics.items()):
+            if old_columns[column_number] != new_columns[column_number]:
+                statistics.remove(old_columns[column_number])
+                statistics.add(new_columns[column_number])
+
+    """
+    # Removes the base RID of a deleted record from the indices, columns holds the latest values of the record
+    """
+
+    def remove_index(self, columns, rid):
+        for index_key in self.get_index_keys():
+            self.remove_value(index_key, self.get_value(index_key, columns), rid)
+        for column_number, statistics in list(self.statistics.items()):
+            statistics.remove(columns[column_number])
+
+    @staticmethod
+    def get_statistics(tree):
+        return ColumnStatistics(sorted((value, len(rids)) for value, rids in tree.items()))
+
+    def get_index_keys(self):
+        # building is read before the trees, a build publishes its tree before leaving building
+        index_keys = list(self.building)
+        index_keys.extend(column_number for column_number, tree in enumerate(self.indices) if tree is not None)
+        index_keys.extend(self.composite_indices)
+        return list(dict.fromkeys(index_keys))
+
+    def get_latches(self, index_key):
+        latches = self.latches.get(index_key)
+        if latches is None:
+            latches = self.latches.setdefault(index_key, IndexLatches())
+        return latches
+
+    def read_entry(self, index_key, value, read):
+        """
+        Read the entry of a value of an index under its latch.
+
+        Args:
+            index_key (int | tuple[int, ...]): The key of the index.
+            value: The indexed value.
+            read (Callable): Called with the RIDs of the entry, it must copy what it returns.
+
+        Returns:
+            The result of read, None if the column is not indexed or no record holds the value.
+        """
+        tree = self.get_tree(index_key)
+        if tree is None:
+            return None
+        with self.get_latches(index_key).stripe(value):
+            rids = tree.get(value)
+            return read(rids) if rids is not None else None
+
+    def get_tree(self, index_key):
+        if isinstance(index_key, int):
+            return self.indices[index_key]
+        return self.composite_indices.get(index_key)
+
+    def set_tree(self, index_key, tree):
+        if isinstance(index_key, int):
+            self.indices[index_key] = tree
+        elif tree is None:
+            self.composite_indices.pop(index_key, None)
+        else:
+            self.composite_indices[index_key] = tree
+
+    def get_value(self, index_key, columns):
+        if isinstance(index_key, int):
+            return columns[index_key]
+        return tuple(columns[column_number] for column_number in index_key)
+
+    def get_included_values(self, index_key, columns):
+        included_columns = self.included.get(index_key)
+        if included_columns is None:
+            return None
+        return tuple(columns[column_number] for column_number in included_columns)
+
+    def add_value(self, index_key, value, rid, included_values=None):
+        if self.log_change(index_key, True, value, rid, included_values):
+            return
+        tree = self.get_tree(index_key)
+        if tree is not None:
+            self.insert_value(tree, self.get_latches(index_key), value, rid, included_values)
+
+    def add_entries(self, index_key, value, entries):
+        if index_key in self.building:
+            with self.lock:
+                if index_key in self.building:
+                    self.building[index_key].extend((True, value, rid, included_values) for rid, included_values in entries.items())
+                    return
+        tree = self.get_tree(index_key)
+        if tree is None:
+            return
+        latches = self.get_latches(index_key)
+        with latches.stripe(value):
+            rids = tree.get(value)
+            is_new = rids is None
+            if is_new:
+                rids = self.create_entry(tree, next(iter(entries.values())))
+            rids.update(entries)
+            if is_new:
+                with latches.tree:
+                    tree[value] = rids
+
+    def remove_value(self, index_key, value, rid):
+        if self.log_change(index_key, False, value, rid, None):
+            return
+        tree = self.get_tree(index_key)
+        if tree is not None:
+            self.delete_value(tree, self.get_latches(index_key), value, rid)
+
+    def log_change(self, index_key, is_insert, value, rid, included_values):
+        """
+        Log a change to an index that is being built, it is applied once the scan of the build is complete.
+
+        Returns:
+            bool: True if the change was logged, False if the index is built.
+        """
+        if index_key not in self.building:
+            return False
+        with self.lock:
+            if index_key not in self.building:
+                return False
+            self.building[index_key].append((is_insert, value, rid, included_values))
+            return True
+
+    @staticmethod
+    def create_entry(tree, included_values):
+        """
+        Create the empty container of the RIDs of a new value of an index.
+
+        Returns:
+            Bitmap | RidArray | dict: A Bitmap for a bitmap index, a RidArray for a hash index without included values,
+            otherwise a dict mapping every RID to its included values.
+        """
+        if isinstance(tree, BitmapIndex):
+            return Bitmap()
+        if isinstance(tree, dict) and included_values is None:
+            return RidArray()
+        return {}
+
+    @staticmethod
+    def insert_value(tree, latches, value, rid, included_values=None):
+        with latches.stripe(value):
+            rids = tree.get(value)
+            if rids is not None:
+                rids[rid] = included_values
+                return
+            rids = Index.create_entry(tree, included_values)
+            rids[rid] = included_values
+            with latches.tree:
+                tree[value] = rids
+
+    @staticmethod
+    def delete_value(tree, latches, value, rid):
+        with latches.stripe(value):
+            rids = tree.get(value)
+            if rids is None or rid not in rids:
+                return
+            del rids[rid]
+            if len(rids) == 0:
+                with latches.tree:
+                    del tree[value]
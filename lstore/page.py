@@ -1,13 +1,25 @@
-from lstore.config import RECORDS_PER_PAGE
-from lstore.util import int_to_8_bytes, eight_bytes_to_int
+import sys
+from array import array
+
+import numpy
+
+from lstore.config import RECORDS_PER_PAGE, PAGE_SIZE
+
+# Type code of the page storage: unsigned 64-bit integers, so MAX_VALUE (2 ** 64 - 1) fits as a sentinel
+PAGE_TYPECODE = 'Q'
+EMPTY_PAGE = bytes(PAGE_SIZE)
 
 
 class Page:
 
     def __init__(self):
         self.num_records = 0
-        self.data = bytearray(4096)
+        self.data = array(PAGE_TYPECODE, EMPTY_PAGE)
         self.is_dirty = True
+        # The number of users of the page in the buffer pool, pinned pages are never evicted
+        self.pin_count = 0
+        # Whether data is a read-only view into a memory-mapped page range file
+        self.is_mapped = False
 
     def has_capacity(self):
         """
@@ -29,11 +41,14 @@ class Page:
         if index is None:
             if not self.has_capacity():
                 raise Exception()
-            index = self.num_records
-            self.data[index * 8:index * 8 + 8] = int_to_8_bytes(value)
+            if self.is_mapped:
+                self.copy_on_write()
+            self.data[self.num_records] = value
             self.num_records += 1
         else:
-            self.data[index * 8:index * 8 + 8] = int_to_8_bytes(value)
+            if self.is_mapped:
+                self.copy_on_write()
+            self.data[index] = value
         self.is_dirty = True
 
     def read(self, index):
@@ -44,4 +59,144 @@ class Page:
         Returns:
             int: The integer value read from the page.
         """
-        return eight_bytes_to_int(self.data[index * 8:index * 8 + 8])
+        return self.data[index]
+
+    def read_many(self, start: int = 0, end: int | None = None):
+        """
+        Read a slice of values from the page.
+        Args:
+            start (int, optional): The first index to read. Defaults to 0.
+            end (int | None, optional): The index after the last one to read. Defaults to the number of records.
+        Returns:
+            list[int]: The values stored in [start, end).
+        """
+        if end is None:
+            end = self.num_records
+        return self.data[start:end].tolist()
+
+    def to_array(self):
+        """
+        Copy the values of the page into a NumPy array.
+        Returns:
+            numpy.ndarray: The RECORDS_PER_PAGE values of the page as unsigned 64-bit integers.
+        """
+        return numpy.frombuffer(self.data, dtype=numpy.uint64).copy()
+
+    def write_many(self, values, start: int = 0):
+        """
+        Overwrite a slice of the page starting at the given index.
+        Args:
+            values (Iterable[int]): The values to be written.
+            start (int, optional): The index of the first value. Defaults to 0.
+        Raises:
+            Exception: If the values do not fit in the page from start.
+        """
+        values = array(PAGE_TYPECODE, values)
+        if start < 0 or start + len(values) > RECORDS_PER_PAGE:
+            raise Exception()
+        if self.is_mapped:
+            self.copy_on_write()
+        self.data[start:start + len(values)] = values
+        self.num_records = max(self.num_records, start + len(values))
+        self.is_dirty = True
+
+    def append_many(self, values):
+        """
+        Append as many of the given values as the page can hold.
+        Args:
+            values (Sequence[int]): The values to be appended.
+        Returns:
+            int: The number of values appended, the caller continues with the rest on the next page.
+        """
+        count = min(len(values), RECORDS_PER_PAGE - self.num_records)
+        if count > 0:
+            self.write_many(values[:count], self.num_records)
+        return count
+
+    def get_memory_size(self):
+        """
+        Get the number of bytes the page occupies in memory, a mapped page occupies PAGE_SIZE bytes of the page cache.
+        Returns:
+            int: The size of the page object and its data.
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self.__dict__) + sys.getsizeof(self.data)
+        if self.is_mapped:
+            size += PAGE_SIZE
+        return size
+
+    def to_bytes(self):
+        """
+        Get the raw contents of the page.
+        Returns:
+            bytes: The PAGE_SIZE bytes of the page.
+        """
+        return self.data.tobytes()
+
+    def load_bytes(self, data):
+        """
+        Replace the contents of the page with raw bytes read from disk.
+        The existing buffer is reused unless the page is mapped.
+        Args:
+            data (bytes | bytearray | memoryview): PAGE_SIZE bytes of page data.
+        """
+        if self.is_mapped:
+            self.data = array(PAGE_TYPECODE)
+            self.data.frombytes(data)
+            self.is_mapped = False
+        else:
+            memoryview(self.data).cast('B')[:] = data
+
+    def load_file(self, f):
+        """
+        Replace the contents of the page with PAGE_SIZE bytes read from the current position of a file, without an intermediate copy.
+        The bytes missing at the end of the file are zeroed.
+        Args:
+            f (BinaryIO): A file opened for reading in binary mode.
+        """
+        if self.is_mapped:
+            self.data = array(PAGE_TYPECODE, EMPTY_PAGE)
+            self.is_mapped = False
+        view = memoryview(self.data).cast('B')
+        size = f.readinto(view)
+        if size < PAGE_SIZE:
+            view[size:] = EMPTY_PAGE[size:]
+
+    def load_values(self, values):
+        """
+        Replace the contents of the page with decoded values, the rest of the page is zeroed.
+        Args:
+            values (Sequence[int]): At most RECORDS_PER_PAGE values.
+        """
+        self.load_bytes(EMPTY_PAGE)
+        self.data[:len(values)] = array(PAGE_TYPECODE, values)
+
+    def clear(self):
+        """
+        Reset the page to an empty, dirty page.
+        """
+        self.load_bytes(EMPTY_PAGE)
+        self.num_records = 0
+        self.is_dirty = True
+
+    def map_bytes(self, view: memoryview):
+        """
+        Use a view into a memory-mapped page range file as the contents of the page without copying it.
+        The view is only read from, the first write copies it into a private array.
+        Args:
+            view (memoryview): PAGE_SIZE bytes of the mapped file.
+        """
+        self.data = view.cast(PAGE_TYPECODE)
+        self.is_mapped = True
+
+    def copy_on_write(self):
+        """
+        Detach the page from the memory-mapped file by copying the mapped contents into a private array.
+        """
+        data = array(PAGE_TYPECODE)
+        data.frombytes(self.data.cast('B'))
+        self.data = data
+        self.is_mapped = False
+
+
+# The memory size of a resident page, used to make room for a page before it is loaded
+PAGE_MEMORY_SIZE = Page().get_memory_size()
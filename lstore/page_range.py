@@ -1,79 +1,82 @@
-from lstore.config import BASE_PAGES_PER_RANGE
-from lstore.page import Page
-
-
-class PageRange:
-    def __init__(self, columns: int):
-        """
-        Initialize a new PageRange object.
-
-        Args:
-            columns (int): The number of columns in the page range.
-        """
-        # The number of columns in the page range
-        self.columns = columns
-        # A 2D list storing base pages, where each inner list represents a set of pages for all columns
-        self.base_pages: list[list[Page]] = []
-        # A 2D list storing tail pages, where each inner list represents a set of pages for all columns
-        self.tail_pages: list[list[Page]] = []
-        # A flag indicating whether the page range has been modified
-        self.is_dirty = True
-        # The index of the page range
-        self.index = None
-        # A reference to the next page range in the linked list
-        self.next_page_range = None
-        # A reference to the previous page range in the linked list
-        self.previous_page_range = None
-
-    def create_page(self, is_tail=False):
-        """
-        Create a new set of pages for all columns.
-
-        Args:
-            is_tail (bool, optional): Whether to create tail pages. Defaults to False.
-        """
-        pages = []
-        for _ in range(self.columns):
-            pages.append(Page())
-        if not is_tail:
-            self.base_pages.append(pages)
-        else:
-            self.tail_pages.append(pages)
-        self.is_dirty = True
-
-    def get_base_page_by_column(self, column: int):
-        """
-        Get the appropriate base page for the given column.
-        If there are no base pages or the last base page for the column is full, create a new set of base pages.
-
-        Args:
-            column (int): The column index.
-
-        Returns:
-            Page: The base page for the specified column.
-        """
-        if len(self.base_pages) == 0:
-            self.create_page()
-        if not self.base_pages[-1][column].has_capacity():
-            self.create_page()
-        return self.base_pages[-1][column]
-
-    def get_tail_page_by_column(self, column: int):
-        """
-        Get the appropriate tail page for the given column.
-        If there are no tail pages or the last tail page for the column is full, create a new set of tail pages.
-
-        Args:
-            column (int): The column index.
-
-        Returns:
-            Page: The tail page for the specified column.
-        """
-        if len(self.tail_pages) == 0:
-            self.create_page(True)
-        if not self.tail_pages[-1][column].has_capacity():
-            self.create_page(True)
-        return self.tail_pages[-1][column]
-
-
-
+import sys
+
+from lstore.config import RECORDS_PER_PAGE
+from lstore.page import Page
+
+
+class PageRange:
+    def __init__(self, columns: int):
+        """
+        Initialize a new PageRange object.
+        The page range only holds the layout of its pages, the pages themselves are resident in the buffer pool
+        and a page that is not resident is None.
+
+        Args:
+            columns (int): The number of columns in the page range.
+        """
+        # The number of columns in the page range
+        self.columns = columns
+        # A 2D list storing base pages, where each inner list represents a set of pages for all columns
+        self.base_pages: list[list[Page | None]] = []
+        # A 2D list storing tail pages, where each inner list represents a set of pages for all columns
+        self.tail_pages: list[list[Page | None]] = []
+        # The number of base records in the page range
+        self.num_base_records = 0
+        # The number of tail records in the page range
+        self.num_tail_records = 0
+        # A flag indicating whether the page range header has been modified
+        self.is_dirty = True
+        # The index of the page range
+        self.index = None
+        # The number of pages of the page range resident in the buffer pool
+        self.num_resident_pages = 0
+        # Read-only memory maps of the column files by column index, used to map pages instead of reading them
+        self.mappings: dict[int, memoryview] = {}
+        # The encoding and encoded length of the compressed base pages on disk by (row, column), other pages are stored raw
+        self.page_encodings: dict[tuple[int, int], tuple[int, int]] = {}
+
+    def create_page(self, is_tail=False):
+        """
+        Create a new set of pages for all columns, the pages are placed by the buffer pool.
+
+        Args:
+            is_tail (bool, optional): Whether to create tail pages. Defaults to False.
+
+        Returns:
+            int: The index of the new set of pages.
+        """
+        pages = [None] * self.columns
+        if not is_tail:
+            self.base_pages.append(pages)
+        else:
+            self.tail_pages.append(pages)
+        self.is_dirty = True
+        return len(self.tail_pages if is_tail else self.base_pages) - 1
+
+    def get_num_records(self, row: int, is_tail=False):
+        """
+        Get the number of records in a set of pages, every set except the last one is full.
+
+        Args:
+            row (int): The index of the set of pages.
+            is_tail (bool, optional): Whether the set holds tail pages. Defaults to False.
+
+        Returns:
+            int: The number of records in each page of the set.
+        """
+        num_records = self.num_tail_records if is_tail else self.num_base_records
+        return max(0, min(RECORDS_PER_PAGE, num_records - row * RECORDS_PER_PAGE))
+
+    def get_memory_size(self):
+        """
+        Get the number of bytes used by the page range object and its page layout, not counting the pages.
+
+        Returns:
+            int: The size of the page range.
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self.__dict__)
+        for rows in (self.base_pages, self.tail_pages):
+            size += sys.getsizeof(rows)
+            if len(rows) > 0:
+                size += len(rows) * sys.getsizeof(rows[0])
+        return size
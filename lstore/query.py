@@ -1,9 +1,19 @@
+import csv
+from array import array
+
+import numpy
+
 from lstore.table import Table, Record
 from lstore.index import Index
-from lstore.config import RID_COLUMN, BASE_RID_COLUMN, METADATA_COLUMNS, INDIRECTION_COLUMN, SCHEMA_ENCODING_COLUMN
-from datetime import datetime
+from lstore.page import PAGE_TYPECODE
+from lstore.config import RID_COLUMN, BASE_RID_COLUMN, METADATA_COLUMNS, INDIRECTION_COLUMN, SCHEMA_ENCODING_COLUMN, FIRST_BASE_RID, MAX_VALUE
+from lstore.config import RECORD_READ_COST, INDEX_ENTRY_COST, SCAN_VALUE_COST, DEFAULT_SELECTIVITY, INSERT_BATCH_SIZE
+
+# The functions of Query.aggregate
+AGGREGATE_FUNCTIONS = ('count', 'sum', 'min', 'max', 'avg')
+# The comparisons of the predicates of Query.aggregate
+WHERE_OPERATORS = {'==': numpy.equal, '!=': numpy.not_equal, '<': numpy.less, '<=': numpy.less_equal, '>': numpy.greater, '>=': numpy.greater_equal}
 
-MAX_VALUE=2 ** 64 - 1
 
 class Query:
     """
@@ -25,10 +35,17 @@ class Query:
     """
 
     def delete(self, primary_key):
-        if primary_key not in self.table.page_directory or primary_key == MAX_VALUE:
-            return False
-        directory = self.table.page_directory[primary_key]
-        self.table.update_value(RID_COLUMN, directory, MAX_VALUE)
+        with self.table.update_lock:
+            if primary_key not in self.table.key_rids:
+                return False
+            rid = self.table.key_rids.pop(primary_key)
+            record = self.table.get_record(rid)
+            columns = record[METADATA_COLUMNS:]
+            if record[INDIRECTION_COLUMN] != MAX_VALUE:
+                columns = self.table.get_record(record[INDIRECTION_COLUMN])[METADATA_COLUMNS:]
+                columns[self.table.key] = primary_key
+            self.table.index.remove_index(columns, rid)
+            self.table.update_value(RID_COLUMN, rid, MAX_VALUE)
         return True
 
     """
@@ -38,20 +55,84 @@ class Query:
     """
 
     def insert(self, *columns):
-        schema_encoding = '0' * self.table.num_columns
         self.table.insert_lock.acquire()
-        rid = self.table.num_records + 92106429
-        time = datetime.now().strftime("%Y%m%d%H%M%S")
-        metadata = [MAX_VALUE, rid, int(time), int(schema_encoding), rid]
+        rid = self.table.num_records + FIRST_BASE_RID
+        metadata = [MAX_VALUE, rid, self.table.next_timestamp(), 0, rid]
         metadata.extend(list(columns))
         self.table.write_base_page(metadata)
         self.table.insert_lock.release()
+        self.table.publish_record(metadata)
+        return True
+
+    """
+    # Insert many records at once, their RIDs and timestamps are allocated in one block,
+    # the base pages are filled column by column and the key map and indices are updated once for all the records
+    # :param rows: list of records, each holding the value of every column
+    # Return True upon succesful insertion
+    # Returns False if a record does not have a value for every column or a value is not an unsigned 64-bit integer,
+    # nothing is inserted then
+    """
+
+    def insert_many(self, rows):
+        rows = list(rows)
+        if any(len(row) != self.table.num_columns for row in rows):
+            return False
+        if len(rows) == 0:
+            return True
+        count = len(rows)
+        # Every value is checked before the first page is written, a failure while appending would leave the column pages misaligned
+        try:
+            columns = [array(PAGE_TYPECODE, column) for column in zip(*rows)]
+        except (OverflowError, TypeError):
+            return False
+        with self.table.insert_lock:
+            first_rid = self.table.num_records + FIRST_BASE_RID
+            first_timestamp = self.table.next_timestamps(count)
+            rids = list(range(first_rid, first_rid + count))
+            metadata = [[MAX_VALUE] * count, rids, list(range(first_timestamp, first_timestamp + count)), [0] * count, rids]
+            self.table.write_base_pages(metadata + columns)
+        self.table.publish_records(metadata + columns)
         return True
 
+    """
+    # Insert the records of a CSV file holding one record per line and the integer value of every column, INSERT_BATCH_SIZE records at a time
+    # Blank lines are skipped
+    # :param path: the path of the CSV file
+    # :param skip_header: whether the first line names the columns instead of holding a record
+    # Returns the number of inserted records upon success
+    # Returns False if a record does not have an integer value for every column, the records of the previous batches stay inserted
+    """
+
+    def load_csv(self, path, skip_header=False):
+        count = 0
+        with open(path, newline='') as f:
+            reader = csv.reader(f)
+            if skip_header:
+                next(reader, None)
+            batch = []
+            for row in reader:
+                # A blank line is read as an empty row
+                if not row:
+                    continue
+                try:
+                    batch.append([int(value) for value in row])
+                except ValueError:
+                    return False
+                if len(batch) == INSERT_BATCH_SIZE:
+                    if not self.insert_many(batch):
+                        return False
+                    count += len(batch)
+                    batch = []
+            if not self.insert_many(batch):
+                return False
+            count += len(batch)
+        return count
+
     """
     # Read matching record with specified search key
     # :param search_key: the value you want to search based on
     # :param search_key_index: the column index you want to search based on
+    #                           a tuple of column indexes searches the tuple of their values in search_key
     # :param projected_columns_index: what columns to return. array of 1 or 0 values.
     # Returns a list of Record objects upon success
     # Returns False if record locked by TPL
@@ -59,28 +140,187 @@ class Query:
     """
 
     def select(self, search_key, search_key_index, projected_columns_index):
+        search_key, search_key_index = self.normalize_search(search_key, search_key_index)
+        projected = [column for column in range(self.table.num_columns) if projected_columns_index[column] is not None]
+        plan = self.plan_select(search_key, search_key_index, projected)
+        access = plan['access']
         rids = []
-        if search_key_index == self.table.key:
-            rids.append(self.table.key_rids[search_key])
-        elif self.table.index.indices[search_key_index] is not None:
+        # The searched values checked on the records read, by column
+        filters = {}
+        if access == 'key':
+            if search_key in self.table.key_rids:
+                rids.append(self.table.key_rids[search_key])
+        elif access == 'covering index':
+            return self.select_covered(search_key, search_key_index, projected)
+        elif access == 'index':
             rids.extend(self.table.index.locate(search_key_index, search_key))
+        elif access == 'bitmap intersection':
+            rids.extend(self.table.index.locate_all(search_key_index, search_key))
+        elif access == 'index filter':
+            filters = dict(zip(search_key_index, search_key))
+            value = filters.pop(plan['column'])
+            if plan['column'] == self.table.key:
+                if value in self.table.key_rids:
+                    rids.append(self.table.key_rids[value])
+            else:
+                rids.extend(self.table.index.locate(plan['column'], value))
         else:
             rids.extend(self.table.get_rids(search_key_index, search_key))
         records = []
+        # Only the projected and filtered columns are read, the key is read from the base record since tail records do not store it
+        read_columns = [METADATA_COLUMNS + column for column in dict.fromkeys(projected + list(filters))]
+        base_columns = [INDIRECTION_COLUMN, BASE_RID_COLUMN, METADATA_COLUMNS + self.table.key] + read_columns
         for rid in rids:
-            record = self.table.get_record(rid)
+            record = self.table.get_record(rid, base_columns)
             if rid == record[BASE_RID_COLUMN]:
                 columns = record[METADATA_COLUMNS:METADATA_COLUMNS + self.table.num_columns + 1]
                 if record[INDIRECTION_COLUMN] != MAX_VALUE:
-                    record_tail = self.table.get_record(record[INDIRECTION_COLUMN])
+                    record_tail = self.table.get_record(record[INDIRECTION_COLUMN], read_columns)
                     columns = record_tail[METADATA_COLUMNS:METADATA_COLUMNS + self.table.num_columns + 1]
                     columns[self.table.key] = record[METADATA_COLUMNS + self.table.key]
+                if any(columns[column] != value for column, value in filters.items()):
+                    continue
                 for column in range(self.table.num_columns):
                     if projected_columns_index[column] is None:
                         columns[column] = None
                 records.append(Record(rid, search_key, columns))
         return records
 
+    """
+    # Read the records matching each of several search keys, every page involved is read once in page order
+    # :param search_keys: list        # the values you want to search based on
+    # :param search_key_index: int    # the column index you want to search based on
+    # :param projected_columns_index: what columns to return. array of 1 or 0 values.
+    # Returns a list holding, for every search key in order, the list of Record objects select would return
+    """
+
+    def select_many(self, search_keys, search_key_index, projected_columns_index):
+        projected = [column for column in range(self.table.num_columns) if projected_columns_index[column] is not None]
+        if search_key_index == self.table.key:
+            matches = [[self.table.key_rids[search_key]] if search_key in self.table.key_rids else [] for search_key in search_keys]
+        elif self.table.index.has_index(search_key_index):
+            matches = [self.table.index.locate(search_key_index, search_key) for search_key in search_keys]
+        else:
+            matches = self.table.get_rids_many(search_key_index, search_keys)
+        rids = [rid for key_matches in matches for rid in key_matches]
+        *values, base_rids = self.table.read_columns(rids, projected, [RID_COLUMN])
+        values = [column_values.tolist() for column_values in values]
+        base_rids = base_rids.tolist()
+        results = []
+        position = 0
+        for search_key, key_matches in zip(search_keys, matches):
+            records = []
+            for rid in key_matches:
+                # The record was deleted after it was found
+                if base_rids[position] != MAX_VALUE:
+                    columns = [None] * self.table.num_columns
+                    for column, column_values in zip(projected, values):
+                        columns[column] = column_values[position]
+                    records.append(Record(rid, search_key, columns))
+                position += 1
+            results.append(records)
+        return results
+
+    """
+    # Describe how select would find the records matching search_key on search_key_index
+    # :param projected_columns_index: the columns select would return, all of them by default
+    # Returns a dict with the chosen access path, the column(s) it uses, the estimated number of matching records and its estimated cost
+    """
+
+    def explain(self, search_key, search_key_index, projected_columns_index=None):
+        search_key, search_key_index = self.normalize_search(search_key, search_key_index)
+        if projected_columns_index is None:
+            projected_columns_index = [1] * self.table.num_columns
+        projected = [column for column in range(self.table.num_columns) if projected_columns_index[column] is not None]
+        return self.plan_select(search_key, search_key_index, projected)
+
+    """
+    # internal Method
+    # A search on a sequence of a single column is a search on that column
+    """
+
+    def normalize_search(self, search_key, search_key_index):
+        if isinstance(search_key_index, (list, tuple)):
+            search_key_index, search_key = tuple(search_key_index), tuple(search_key)
+            if len(search_key_index) == 1:
+                search_key_index, search_key = search_key_index[0], search_key[0]
+        return search_key, search_key_index
+
+    """
+    # internal Method
+    # Choose the cheapest way to find the records of a select, estimating the matching records from the indices and column statistics:
+    # key: the primary key lookup
+    # covering index: the index of the searched column(s) holds every projected column, the records are not read
+    # index: the index of the searched column(s)
+    # bitmap intersection: every searched column has an index, their matching RIDs are intersected
+    # index filter: the index of the most selective searched column, the records read are checked against the other searched values
+    # scan: a scan of the searched columns of every record
+    """
+
+    def plan_select(self, search_key, search_key_index, projected):
+        index = self.table.index
+        if search_key_index == self.table.key:
+            rows = 1 if search_key in self.table.key_rids else 0
+            return self.make_plan('key', search_key_index, rows, RECORD_READ_COST)
+        estimate = index.estimate(search_key_index, search_key)
+        if estimate is not None:
+            rows, entries = estimate
+            if index.covers(search_key_index, projected):
+                return self.make_plan('covering index', search_key_index, rows, entries * INDEX_ENTRY_COST)
+            return self.make_plan('index', search_key_index, rows, entries * INDEX_ENTRY_COST + rows * RECORD_READ_COST)
+        columns = search_key_index if isinstance(search_key_index, tuple) else (search_key_index,)
+        values = search_key if isinstance(search_key_index, tuple) else (search_key,)
+        num_records = len(self.table.key_rids)
+        # The matches of every column, assuming the columns are independent
+        selectivities = {}
+        estimates = {}
+        for column, value in zip(columns, values):
+            if column == self.table.key:
+                estimates[column] = (1, 0) if value in self.table.key_rids else (0, 0)
+            else:
+                estimates[column] = index.estimate(column, value)
+            rows = estimates[column][0] if estimates[column] is not None else index.estimate_rows(column, value)
+            selectivities[column] = DEFAULT_SELECTIVITY if rows is None else rows / max(1, num_records)
+        rows = num_records
+        for selectivity in selectivities.values():
+            rows *= selectivity
+        plans = [self.make_plan('scan', search_key_index, rows, num_records * len(columns) * SCAN_VALUE_COST + rows * RECORD_READ_COST)]
+        if all(estimates[column] is not None and column != self.table.key for column in columns):
+            entries = sum(estimates[column][1] for column in columns)
+            plans.append(self.make_plan('bitmap intersection', search_key_index, rows, entries * INDEX_ENTRY_COST + rows * RECORD_READ_COST))
+        for column in columns:
+            if estimates[column] is None:
+                continue
+            column_rows, entries = estimates[column]
+            plans.append(self.make_plan('index filter', column, rows, entries * INDEX_ENTRY_COST + column_rows * RECORD_READ_COST))
+        return min(plans, key=lambda plan: plan['cost'])
+
+    @staticmethod
+    def make_plan(access, column, rows, cost):
+        return {'access': access, 'column': column, 'estimated_rows': rows, 'cost': cost}
+
+    """
+    # internal Method
+    # Answer a select from an index holding every projected column, without reading the records
+    """
+
+    def select_covered(self, search_key, search_key_index, projected):
+        key_columns = (search_key_index,) if isinstance(search_key_index, int) else search_key_index
+        key_values = (search_key,) if isinstance(search_key_index, int) else search_key
+        included_columns = self.table.index.included.get(search_key_index, ())
+        records = []
+        for rid, included_values in self.table.index.locate_covered(search_key_index, search_key):
+            columns = [None] * self.table.num_columns
+            for column, value in zip(key_columns, key_values):
+                columns[column] = value
+            for column, value in zip(included_columns, included_values or ()):
+                columns[column] = value
+            for column in range(self.table.num_columns):
+                if column not in projected:
+                    columns[column] = None
+            records.append(Record(rid, search_key, columns))
+        return records
+
     """
     # Read matching record with specified search key
     # :param search_key: the value you want to search based on
@@ -96,32 +336,11 @@ class Query:
         rids = []
         records = []
         if search_key_index == self.table.key:
-            rids.append(self.table.key_rids[search_key])
-        elif self.table.index.indices[search_key_index] is not None:
-            rids = self.table.index.locate(search_key_index, search_key)
-            base_rids = []
-            columns = []
-            for rid in rids:
-                record = self.table.get_record(rid)
-                base_rid = record[BASE_RID_COLUMN]
-                base_record = self.table.get_record(base_rid)
-                tail_record = base_record
-                relative_version = (relative_version * -1) + 1
-                if base_record[INDIRECTION_COLUMN] != MAX_VALUE:
-                    for i in range(relative_version):
-                        tail_rid = tail_record[INDIRECTION_COLUMN]
-                        tail_record = self.table.get_record(tail_rid)
-                        columns = tail_record[METADATA_COLUMNS:METADATA_COLUMNS + self.table.num_columns + 1]
-                        columns[self.table.key] = record[METADATA_COLUMNS + self.table.key]
-                        if tail_rid == rid or tail_rid == base_rid:
-                            break
-
-                if tail_record == record:
-                    record = Record(base_rid, search_key, columns)
-                if base_rid not in base_rids:
-                    records.append(record)
-                    base_rids.append(base_rid)
-            return records
+            if search_key in self.table.key_rids:
+                rids.append(self.table.key_rids[search_key])
+        elif self.table.index.has_index(search_key_index):
+            # The index holds the base RIDs of the records by their latest values
+            rids.extend(self.table.index.locate(search_key_index, search_key))
         else:
             rids.extend(self.table.get_rids(search_key_index, search_key))
         for rid in rids:
@@ -150,44 +369,47 @@ class Query:
         if primary_key not in self.table.key_rids:
             return False
         rid = self.table.key_rids[primary_key]
-        if rid not in self.table.page_directory or rid == MAX_VALUE:
+        if not self.table.has_record(rid) or rid == MAX_VALUE:
             return False
         self.table.update_lock.acquire()
         record = self.table.get_record(rid)
         base_rid = record[RID_COLUMN]
         base_indirection = record[INDIRECTION_COLUMN]
         column_list = list(columns)
-        new_tail_str = ''
+        # Bit i of the schema encoding is set when column i has been updated
+        new_schema_encoding = 0
         new_tail_rid = self.table.num_updates
+        # The record holding the latest values, which the indices point to
+        latest_record = record
         if base_indirection == MAX_VALUE:
             new_tail_indirection = rid
             for i in range(len(column_list)):
                 if column_list[i] is None:
                     column_list[i] = record[i + METADATA_COLUMNS]
-                    new_tail_str += '0'
                 else:
-                    new_tail_str += '1'
+                    new_schema_encoding |= 1 << i
         else:
             tail_record = self.table.get_record(base_indirection)
+            latest_record = tail_record
+            new_schema_encoding = tail_record[SCHEMA_ENCODING_COLUMN]
             for i in range(len(column_list)):
                 if column_list[i] is None:
                     column_list[i] = tail_record[i + METADATA_COLUMNS]
-                    if (tail_record[SCHEMA_ENCODING_COLUMN] // (10 ** i)) % 10:
-                        new_tail_str += '1'
-                    else:
-                        new_tail_str += '0'
                 else:
-                    new_tail_str += '1'
+                    new_schema_encoding |= 1 << i
             new_tail_indirection = tail_record[RID_COLUMN]
-        meta_data = [new_tail_indirection, new_tail_rid, int(datetime.now().strftime("%Y%m%d%H%M%S")), new_tail_str, base_rid]
+        meta_data = [new_tail_indirection, new_tail_rid, self.table.next_timestamp(), new_schema_encoding, base_rid]
         column_list[self.table.key] = MAX_VALUE
         meta_data.extend(column_list)
         self.table.write_tail_page(meta_data)
+        latest_columns = latest_record[METADATA_COLUMNS:]
+        latest_columns[self.table.key] = primary_key
+        self.table.index.update_index(rid, latest_columns, columns)
         base_encoding = record[SCHEMA_ENCODING_COLUMN]
-        new_base_encoding = base_encoding or new_tail_str
-        base_address = self.table.page_directory[rid]
-        self.table.update_value(INDIRECTION_COLUMN, base_address, new_tail_rid)
-        self.table.update_value(SCHEMA_ENCODING_COLUMN, base_address, new_base_encoding)
+        new_base_encoding = base_encoding | new_schema_encoding
+        # The schema encoding is written first, a reader seeing the new tail record also sees which columns it updated
+        self.table.update_value(SCHEMA_ENCODING_COLUMN, rid, new_base_encoding)
+        self.table.update_value(INDIRECTION_COLUMN, rid, new_tail_rid)
         self.table.update_lock.release()
         return True
 
@@ -195,24 +417,110 @@ class Query:
     :param start_range: int         # Start of the key range to aggregate
     :param end_range: int           # End of the key range to aggregate
     :param aggregate_columns: int  # Index of desired column to aggregate
+    :param where: dict             # Optional predicates the aggregated records must also satisfy, as for aggregate
     # this function is only called on the primary key.
     # Returns the summation of the given range upon success
     # Returns False if no record exists in the given range
     """
 
-    def sum(self, start_range, end_range, aggregate_column_index):
-        summation = 0
-        has_no_record = True
-        for key in range(start_range, end_range + 1):
-            if key in self.table.key_rids.keys():
-                record = self.select(key, self.table.key, [1 for i in range(self.table.num_columns)])[0]
-                value = record.columns[aggregate_column_index]
-                if value is not None:
-                    summation += value
-                has_no_record = False
-        if has_no_record:
+    def sum(self, start_range, end_range, aggregate_column_index, where=None):
+        return self.aggregate('sum', aggregate_column_index, start_range, end_range, where=where)
+
+    """
+    :param function: str            # The aggregate function, one of count, sum, min, max and avg
+    :param aggregate_column_index: int  # Index of desired column to aggregate
+    :param start_range: int         # Start of the key range to aggregate, None for the smallest key
+    :param end_range: int           # End of the key range to aggregate, None for the largest key
+    :param group_by: int            # Optional index of the column whose values group the records
+    :param where: dict             # Optional predicates the aggregated records must also satisfy, by column index:
+    #                                 a value for an equality, or a tuple (operator, value) with an operator of WHERE_OPERATORS
+    # The latest values are read column by column, one page range worth of records at a time, and the partial results are merged
+    # Returns the aggregate upon success, or a dict mapping every group value to the aggregate of its records with group_by
+    # Returns False if no record exists in the given range, or if the function, a column or a predicate is not valid
+    """
+
+    def aggregate(self, function, aggregate_column_index, start_range=None, end_range=None, group_by=None, where=None):
+        if function not in AGGREGATE_FUNCTIONS:
             return False
-        return summation
+        predicates = {}
+        for column, predicate in (where or {}).items():
+            operator, value = predicate if isinstance(predicate, tuple) else ('==', predicate)
+            if operator not in WHERE_OPERATORS or not isinstance(value, int) or not 0 <= column < self.table.num_columns:
+                return False
+            predicates[column] = (WHERE_OPERATORS[operator], value)
+        columns = [aggregate_column_index] + ([] if group_by is None else [group_by])
+        if not all(0 <= column < self.table.num_columns for column in columns):
+            return False
+        # When every predicate is an equality on an indexed column, the intersection of the indices filters the records before they are read
+        matches = None
+        if predicates and all(operator is numpy.equal for operator, _ in predicates.values()):
+            matches = self.table.index.locate_all(tuple(predicates), tuple(value for _, value in predicates.values()))
+        if matches is not None:
+            matches = set(matches)
+            predicates = {}
+        # The count, sum, minimum and maximum of every group
+        partials = {}
+        batches = self.table.get_key_rid_batches(0 if start_range is None else start_range, MAX_VALUE if end_range is None else end_range)
+        for rids in batches:
+            if matches is not None:
+                rids = [rid for rid in rids if rid in matches]
+            values, *arrays = self.table.read_columns(rids, columns + list(predicates))
+            groups = arrays[0] if group_by is not None else numpy.zeros(len(values), dtype=numpy.uint64)
+            matching = numpy.ones(len(values), dtype=bool)
+            for column_values, (operator, value) in zip(arrays[len(columns) - 1:], predicates.values()):
+                # A value outside of the column range compares the same way to every value of the column
+                matching &= operator(column_values, numpy.uint64(value)) if 0 <= value <= MAX_VALUE else operator(0 if value < 0 else MAX_VALUE, value)
+            values, groups = values[matching], groups[matching]
+            if len(values) > 0:
+                self.merge_partials(partials, values, groups)
+        if len(partials) == 0:
+            return False
+        results = {group: self.finish_partial(function, partial) for group, partial in partials.items()}
+        if group_by is None:
+            return results[0]
+        return results
+
+    """
+    # internal Method
+    # Merge the count, sum, minimum and maximum of every group of a batch of values into partials
+    """
+
+    @staticmethod
+    def merge_partials(partials, values, groups):
+        # The records of every group are made contiguous, then the partial results are computed for all groups at once
+        order = numpy.argsort(groups, kind='stable')
+        values, groups = values[order], groups[order]
+        starts = numpy.flatnonzero(numpy.concatenate(([True], groups[1:] != groups[:-1])))
+        counts = numpy.diff(numpy.append(starts, len(values)))
+        # The values are summed as unsigned 64-bit integers unless a sum could overflow
+        if int(values.max()) * int(counts.max()) > MAX_VALUE:
+            sums = [sum(group.tolist()) for group in numpy.split(values, starts[1:])]
+        else:
+            sums = numpy.add.reduceat(values, starts).tolist()
+        minimums = numpy.minimum.reduceat(values, starts).tolist()
+        maximums = numpy.maximum.reduceat(values, starts).tolist()
+        for group, count, total, minimum, maximum in zip(groups[starts].tolist(), counts.tolist(), sums, minimums, maximums):
+            partial = partials.get(group)
+            if partial is None:
+                partials[group] = [count, total, minimum, maximum]
+            else:
+                partial[0] += count
+                partial[1] += total
+                partial[2] = min(partial[2], minimum)
+                partial[3] = max(partial[3], maximum)
+
+    @staticmethod
+    def finish_partial(function, partial):
+        count, total, minimum, maximum = partial
+        if function == 'count':
+            return count
+        if function == 'sum':
+            return total
+        if function == 'min':
+            return minimum
+        if function == 'max':
+            return maximum
+        return total / count
 
     """
     :param start_range: int         # Start of the key range to aggregate
@@ -227,13 +535,12 @@ class Query:
     def sum_version(self, start_range, end_range, aggregate_column_index, relative_version):
         summation = 0
         has_no_record = True
-        for key in range(start_range, end_range + 1):
-            if key in self.table.key_rids.keys():
-                record = self.select_version(key, self.table.key, [1 for i in range(self.table.num_columns)], relative_version)[0]
-                value = record.columns[aggregate_column_index]
-                if value is not None:
-                    summation += value
-                has_no_record = False
+        for key in self.table.get_keys(start_range, end_range):
+            record = self.select_version(key, self.table.key, [1 for i in range(self.table.num_columns)], relative_version)[0]
+            value = record.columns[aggregate_column_index]
+            if value is not None:
+                summation += value
+            has_no_record = False
         if has_no_record:
             return False
         return summation
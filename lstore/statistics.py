@@ -0,0 +1,79 @@
+"""
+Statistics of the values of a column, used by the query planner to estimate how many records match a predicate.
+The values are summarized by an equi-depth histogram: every bucket covers a range of values holding about the same number of records.
+"""
+from bisect import bisect_left
+
+from lstore.config import HISTOGRAM_BUCKETS
+
+
+class ColumnStatistics:
+
+    def __init__(self, value_counts, num_buckets: int = HISTOGRAM_BUCKETS):
+        """
+        Build the statistics of a column.
+
+        Args:
+            value_counts (Iterable[tuple[int, int]]): The distinct values of the column in ascending order, each with its number of records.
+            num_buckets (int, optional): The number of buckets of the histogram. Defaults to HISTOGRAM_BUCKETS.
+        """
+        value_counts = list(value_counts)
+        # Number of records counted
+        self.count = sum(count for _, count in value_counts)
+        # Number of distinct values when the statistics were built
+        self.distinct = len(value_counts)
+        # Smallest value when the statistics were built
+        self.minimum = value_counts[0][0] if value_counts else None
+        # Largest value of every bucket, bucket i holds the values above bounds[i - 1] up to bounds[i]
+        self.bounds: list[int] = []
+        # Number of records of every bucket
+        self.counts: list[int] = []
+        # Number of distinct values of every bucket when the statistics were built
+        self.distinct_counts: list[int] = []
+        depth = -(-self.count // num_buckets)
+        for value, count in value_counts:
+            if len(self.counts) == 0 or self.counts[-1] >= depth:
+                self.bounds.append(value)
+                self.counts.append(0)
+                self.distinct_counts.append(0)
+            self.bounds[-1] = value
+            self.counts[-1] += count
+            self.distinct_counts[-1] += 1
+
+    def add(self, value: int):
+        """
+        Count a record inserted with the given value, a value above the histogram extends its last bucket.
+        """
+        if len(self.bounds) == 0:
+            self.minimum = value
+            self.bounds.append(value)
+            self.counts.append(0)
+            self.distinct_counts.append(1)
+        bucket = bisect_left(self.bounds, value)
+        if bucket == len(self.bounds):
+            bucket -= 1
+            self.bounds[bucket] = value
+        self.minimum = min(self.minimum, value)
+        self.counts[bucket] += 1
+        self.count += 1
+
+    def remove(self, value: int):
+        """
+        Stop counting a record that held the given value.
+        """
+        bucket = bisect_left(self.bounds, value)
+        if bucket < len(self.bounds) and self.counts[bucket] > 0:
+            self.counts[bucket] -= 1
+            self.count -= 1
+
+    def estimate_equal(self, value: int):
+        """
+        Estimate the number of records holding a value, assuming the values of its bucket are equally frequent.
+
+        Returns:
+            float: The estimated number of records.
+        """
+        bucket = bisect_left(self.bounds, value)
+        if bucket == len(self.bounds) or value < self.minimum:
+            return 0.0
+        return self.counts[bucket] / max(1, self.distinct_counts[bucket])
@@ -1,12 +1,19 @@
+import mmap
 import os.path
+from array import array
+from itertools import islice
+
+import numpy
 
 from lstore.index import Index
-from time import time
+from time import time_ns
 from lstore.util import eight_bytes_to_int, int_to_8_bytes
-from lstore.config import RECORD_SIZE, METADATA_COLUMNS, PAGE_SIZE, RECORDS_PER_PAGE, BASE_PAGES_PER_RANGE, BASE_RID_COLUMN, RID_COLUMN
+from lstore.config import AGGREGATE_BATCH_SIZE, RECORD_SIZE, METADATA_COLUMNS, PAGE_SIZE, RECORDS_PER_PAGE, BASE_PAGES_PER_RANGE, BASE_RID_COLUMN, RID_COLUMN, INDIRECTION_COLUMN, SCHEMA_ENCODING_COLUMN, PAGE_RANGE_MMAP, PAGE_COMPRESSION, FIRST_BASE_RID, MAX_VALUE
+from lstore.compression import RAW, encode_page, decode_page
 from lstore.page_range import PageRange
-from lstore.lru import LRU
+from lstore.bufferpool import BufferPool
 from threading import Lock
+from BTrees.QQBTree import QQBTree
 
 
 class Record:
@@ -24,15 +31,17 @@ class Table:
     :param key: int             #Index of table key in columns
     """
 
-    def __init__(self, name, num_columns, key, database_directory):
+    def __init__(self, name, num_columns, key, database_directory, bufferpool: BufferPool | None = None):
         # The name of the table.
         self.name = name
         # The index of the table key in the columns.
         self.key = key
         #  The number of columns in the table, all columns are integers.
         self.num_columns = num_columns
-        # A dictionary mapping record identifiers (RID) to their page addresses.
-        self.page_directory = {}
+        # The page address of every tail record indexed by its RID: the page range index in the high 32 bits
+        # and the index of the record among the tail records of the page range in the low 32 bits.
+        # Base records are not stored, their address is computed from their RID.
+        self.tail_directory = array('Q')
         # An index object for the table.
         self.index = Index(self)
         # The directory where the database files are stored.
@@ -41,18 +50,26 @@ class Table:
         self.num_records = 0
         # The number of record updates in the table.
         self.num_updates = 0
-        # A dictionary storing page ranges in the buffer pool.
-        self.buffer_pool: dict[int, PageRange] = {}
-        # An LRU cache object for managing page ranges.
-        self.lru = LRU(self)
-        # A dictionary mapping keys to their corresponding record identifiers.
-        self.key_rids = {}
+        # The size of the page range header file: the counts and a descriptor per base page.
+        self.header_size = (4 + BASE_PAGES_PER_RANGE * (num_columns + METADATA_COLUMNS)) * RECORD_SIZE
+        # A dictionary storing the loaded page ranges of the table, their pages are resident in the buffer pool.
+        self.page_ranges: dict[int, PageRange] = {}
+        # The indexes of all page ranges of the table, including the ones released by the buffer pool.
+        self.page_range_indexes: set[int] = set()
+        # The buffer pool caching the pages of the table, shared by the tables of a database.
+        self.bufferpool = bufferpool if bufferpool is not None else BufferPool()
+        # An ordered mapping of keys to the RIDs of their base records, so key ranges only visit existing keys.
+        self.key_rids = QQBTree()
         # A dictionary of locks for synchronization.
         self.locks = {}
         # A lock for insert operations.
         self.insert_lock: Lock = Lock()
         # A lock for update operations.
         self.update_lock: Lock = Lock()
+        # The last timestamp given to a record, in nanoseconds since the epoch.
+        self.last_timestamp = 0
+        # A lock for the timestamp clock.
+        self.timestamp_lock: Lock = Lock()
         pass
 
     def open(self):
@@ -72,28 +89,17 @@ class Table:
             # Read the page range ID
             page_range_id = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
             offset += RECORD_SIZE
-            page_range_file = os.path.join(self.database_directory, self.name, f'{page_range_id}.page_range')
-            page_range = self.read_page_range(page_range_file)
-            self.buffer_pool[page_range_id] = page_range
-            self.lru.page_range_created(page_range)
-        # Read the number of key directories
-        num_key_directories = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
+            # Page ranges are loaded on first use
+            self.page_range_indexes.add(page_range_id)
+        # Read the number of base and tail records
+        self.num_records = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
         offset += RECORD_SIZE
-        for _ in range(num_key_directories):
-            key = eight_bytes_to_int(data[offset:offset+RECORD_SIZE])
-            offset += RECORD_SIZE
-            address = [None for _ in range(4)]
-            address[0] = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
-            offset += RECORD_SIZE
-            length = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
-            offset += RECORD_SIZE
-            address[1] = data[offset:offset + length].decode('utf-8')
-            offset += length
-            address[2] = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
-            offset += RECORD_SIZE
-            address[3] = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
-            offset += RECORD_SIZE
-            self.page_directory[key] = address
+        self.num_updates = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
+        offset += RECORD_SIZE
+        # Read the tail directory
+        self.tail_directory = array('Q')
+        self.tail_directory.frombytes(data[offset:offset + self.num_updates * RECORD_SIZE])
+        offset += self.num_updates * RECORD_SIZE
         # Read the number of keys
         num_keys = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
         offset += RECORD_SIZE
@@ -103,6 +109,7 @@ class Table:
             rid = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
             offset += RECORD_SIZE
             self.key_rids[key] = rid
+        self.index.read_indices(os.path.join(self.database_directory, self.name))
 
     def close(self):
         """
@@ -112,38 +119,33 @@ class Table:
             os.mkdir(os.path.join(self.database_directory, self.name))
         metadata_file = os.path.join(self.database_directory, self.name, 'metadata.table')
         data_size = 0
-        data_size += 3 * RECORD_SIZE * len(self.buffer_pool) + RECORD_SIZE
-        data_size += len(self.page_directory) * RECORD_SIZE * 5 + RECORD_SIZE
-        data_size += len(self.key_rids) * RECORD_SIZE * 2 + RECORD_SIZE
+        data_size += 3 * RECORD_SIZE * len(self.page_range_indexes) + RECORD_SIZE
+        data_size += 2 * RECORD_SIZE + len(self.tail_directory) * RECORD_SIZE
+        num_keys = len(self.key_rids)
+        data_size += num_keys * RECORD_SIZE * 2 + RECORD_SIZE
         data = bytearray(data_size)
         offset = 0
         # Write the number of page ranges
-        data[offset:offset + RECORD_SIZE] = int_to_8_bytes(len(self.buffer_pool))
-        offset += RECORD_SIZE
-        if len(self.buffer_pool) != 0:
-            page_range = self.lru.oldest_page_range
-            while page_range is not None:
-                data[offset:offset + RECORD_SIZE] = int_to_8_bytes(page_range.index)
-                offset += RECORD_SIZE
-                self.lru.delete_page()
-                page_range = self.lru.oldest_page_range
-        data[offset:offset + RECORD_SIZE] = int_to_8_bytes(len(self.page_directory))
+        data[offset:offset + RECORD_SIZE] = int_to_8_bytes(len(self.page_range_indexes))
         offset += RECORD_SIZE
-        for key, address in self.page_directory.items():
-            data[offset:offset + RECORD_SIZE] = int_to_8_bytes(key)
-            offset += RECORD_SIZE
-            data[offset: offset + RECORD_SIZE] = int_to_8_bytes(address[0])
-            offset += RECORD_SIZE
-            b = address[1].encode('utf-8')
-            data[offset:offset + RECORD_SIZE] = int_to_8_bytes(len(b))
-            offset += RECORD_SIZE
-            data[offset: offset + len(b)] = b[:]
-            offset += len(b)
-            data[offset: offset + RECORD_SIZE] = int_to_8_bytes(address[2])
+        for page_range_index in self.page_range_indexes:
+            data[offset:offset + RECORD_SIZE] = int_to_8_bytes(page_range_index)
             offset += RECORD_SIZE
-            data[offset: offset + RECORD_SIZE] = int_to_8_bytes(address[3])
-            offset += RECORD_SIZE
-        data[offset: offset + RECORD_SIZE] = int_to_8_bytes(len(self.key_rids))
+        # Waits for the indices built in the background, they read the pages
+        self.index.wait_for_index()
+        self.index.write_indices(os.path.join(self.database_directory, self.name))
+        # Writes the dirty pages and page range headers, then waits for the background writer
+        self.bufferpool.evict_table(self)
+        self.bufferpool.flusher.flush()
+        # Write the number of base and tail records
+        data[offset:offset + RECORD_SIZE] = int_to_8_bytes(self.num_records)
+        offset += RECORD_SIZE
+        data[offset:offset + RECORD_SIZE] = int_to_8_bytes(self.num_updates)
+        offset += RECORD_SIZE
+        # Write the tail directory
+        data[offset:offset + len(self.tail_directory) * RECORD_SIZE] = self.tail_directory.tobytes()
+        offset += len(self.tail_directory) * RECORD_SIZE
+        data[offset: offset + RECORD_SIZE] = int_to_8_bytes(num_keys)
         offset += RECORD_SIZE
         for key, rid in self.key_rids.items():
             data[offset: offset + RECORD_SIZE] = int_to_8_bytes(key)
@@ -153,9 +155,35 @@ class Table:
         with open(metadata_file, 'wb') as f:
             f.write(data)
 
+    def get_page_range_file(self, page_range_index):
+        """
+        Get the path of the file storing the header of a page range.
+
+        Args:
+            page_range_index (int): The index of the page range.
+
+        Returns:
+            str: The path to the page range file.
+        """
+        return os.path.join(self.database_directory, self.name, f'{page_range_index}.page_range')
+
+    def get_column_file(self, page_range_index, column):
+        """
+        Get the path of the file storing the pages of one column of a page range.
+
+        Args:
+            page_range_index (int): The index of the page range.
+            column (int): The column index, counting the metadata columns.
+
+        Returns:
+            str: The path to the column file.
+        """
+        return os.path.join(self.database_directory, self.name, f'{page_range_index}.{column}.column')
+
     def read_page_range(self, page_range_file):
         """
-        Read a page range from disk.
+        Read the header of a page range from disk.
+        The pages are not loaded, they are read one at a time by the buffer pool through read_page.
 
         Args:
             page_range_file (str): The path to the page range file.
@@ -165,224 +193,616 @@ class Table:
         """
         page_range = PageRange(self.num_columns + METADATA_COLUMNS)
         with open(page_range_file, 'rb') as f:
-            data = f.read()
+            data = f.read(self.header_size)
         offset = 0
         num_base_pages = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
         offset += RECORD_SIZE
         num_tail_pages = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
         offset += RECORD_SIZE
-        for i in range(num_base_pages):
+        page_range.num_base_records = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
+        offset += RECORD_SIZE
+        page_range.num_tail_records = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
+        offset += RECORD_SIZE
+        for _ in range(num_base_pages):
             page_range.create_page()
-            for column in range(page_range.columns):
-                page = page_range.base_pages[-1][column]
-                page.num_records = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
-                offset += RECORD_SIZE
-                page.data = bytearray(data[offset:offset + PAGE_SIZE])
-                offset += PAGE_SIZE
-                page.is_dirty = False
-        for i in range(num_tail_pages):
+        for _ in range(num_tail_pages):
             page_range.create_page(True)
+        for row in range(num_base_pages):
             for column in range(page_range.columns):
-                page = page_range.tail_pages[-1][column]
-                page.num_records = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
+                # A descriptor is the encoding in the high word and the encoded length in the low word, 0 for raw pages
+                descriptor = eight_bytes_to_int(data[offset:offset + RECORD_SIZE])
                 offset += RECORD_SIZE
-                page.data = bytearray(data[offset:offset + PAGE_SIZE])
-                offset += PAGE_SIZE
-                # page.is_dirty = False
+                if descriptor != 0:
+                    page_range.page_encodings[(row, column)] = (descriptor >> 32, descriptor & 0xFFFFFFFF)
         page_range.is_dirty = False
         return page_range
 
     def write_page_range(self, page_range_file, page_range: PageRange):
         """
-        Write a page range to disk.
+        Write the header of a page range to disk.
+        The pages are written to their column files when the buffer pool evicts them, through the background writer with BACKGROUND_FLUSH,
+        so a page range is only written once none of its pages is resident.
 
         Args:
             page_range_file (str): The path to the page range file.
             page_range (PageRange): The page range object to be written.
         """
-        num_base_pages = len(page_range.base_pages)
-        num_tail_pages = len(page_range.tail_pages)
-        data = bytearray(((num_base_pages + num_tail_pages) * (PAGE_SIZE + RECORD_SIZE) * (self.num_columns + METADATA_COLUMNS)) + 2 * RECORD_SIZE)
+        header = bytearray(self.header_size)
         offset = 0
-        data[offset:offset + RECORD_SIZE] = int_to_8_bytes(num_base_pages)
+        header[offset:offset + RECORD_SIZE] = int_to_8_bytes(len(page_range.base_pages))
         offset += RECORD_SIZE
-        data[offset:offset + RECORD_SIZE] = int_to_8_bytes(num_tail_pages)
+        header[offset:offset + RECORD_SIZE] = int_to_8_bytes(len(page_range.tail_pages))
         offset += RECORD_SIZE
-        for row in range(num_base_pages):
-            for col in range(self.num_columns + METADATA_COLUMNS):
-                page = page_range.base_pages[row][col]
-                data[offset:offset + RECORD_SIZE] = int_to_8_bytes(page.num_records)
-                offset += RECORD_SIZE
-                data[offset:offset + PAGE_SIZE] = page.data
-                offset += PAGE_SIZE
-        for row in range(num_tail_pages):
-            for col in range(self.num_columns + METADATA_COLUMNS):
-                page = page_range.tail_pages[row][col]
-                data[offset:offset + RECORD_SIZE] = int_to_8_bytes(page.num_records)
-                offset += RECORD_SIZE
-                data[offset:offset + PAGE_SIZE] = page.data
-                offset += PAGE_SIZE
-        with open(page_range_file, 'wb') as f:
+        header[offset:offset + RECORD_SIZE] = int_to_8_bytes(page_range.num_base_records)
+        offset += RECORD_SIZE
+        header[offset:offset + RECORD_SIZE] = int_to_8_bytes(page_range.num_tail_records)
+        offset += RECORD_SIZE
+        with self.bufferpool.lock:
+            for row in range(len(page_range.base_pages)):
+                for column in range(page_range.columns):
+                    encoding, length = page_range.page_encodings.get((row, column), (RAW, 0))
+                    header[offset:offset + RECORD_SIZE] = int_to_8_bytes(encoding << 32 | length)
+                    offset += RECORD_SIZE
+            with self.open_page_range_file(page_range_file) as f:
+                f.write(header)
+            page_range.is_dirty = False
+
+    def read_page(self, page_range: PageRange, is_tail, row, column, page, data=None):
+        """
+        Read a page from its column file.
+        With PAGE_RANGE_MMAP the file is memory-mapped and a raw page is a view into the mapping,
+        so loading copies nothing and the page is only copied once it is modified.
+        Compressed pages are decoded into the page.
+
+        Args:
+            page_range (PageRange): The page range the page belongs to.
+            is_tail (bool): Whether the page is a tail page.
+            row (int): The index of the page within the base or tail pages.
+            column (int): The column index.
+            page (Page): The page receiving the contents.
+            data (bytes | None, optional): The stored contents of the page if they are already known,
+                such as a page waiting for the background writer. Defaults to None.
+        """
+        encoding, length = RAW, PAGE_SIZE
+        if not is_tail:
+            encoding, length = page_range.page_encodings.get((row, column), (RAW, PAGE_SIZE))
+        num_records = page_range.get_num_records(row, is_tail)
+        if data is None:
+            offset = self.calculate_page_offset(row, is_tail)
+            column_file = self.get_column_file(page_range.index, column)
+            if PAGE_RANGE_MMAP:
+                mapping = page_range.mappings.get(column)
+                if mapping is None or len(mapping) < offset + length:
+                    # Map the file again when pages were appended after it was mapped
+                    with open(column_file, 'rb') as f:
+                        mapping = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                    page_range.mappings[column] = mapping
+                data = mapping[offset:offset + length]
+                if encoding == RAW:
+                    page.map_bytes(data)
+                    data = None
+            else:
+                with open(column_file, 'rb') as f:
+                    f.seek(offset)
+                    if encoding == RAW:
+                        # The raw page is read straight into the frame
+                        page.load_file(f)
+                    else:
+                        data = f.read(length)
+        if data is not None:
+            if encoding == RAW:
+                page.load_bytes(data)
+            else:
+                page.load_values(decode_page(encoding, data, num_records))
+        page.num_records = num_records
+        page.is_dirty = False
+
+    def serialize_page(self, page_range: PageRange, is_tail, row, column, page):
+        """
+        Get the stored contents of a page.
+        With PAGE_COMPRESSION a base page is encoded with the smallest encoding and its descriptor is
+        recorded in the page range header, the page keeps its fixed slot so it can be stored raw again later.
+        Tail pages are always stored raw, they are appended to and rewritten the most.
+
+        Args:
+            page_range (PageRange): The page range the page belongs to.
+            is_tail (bool): Whether the page is a tail page.
+            row (int): The index of the page within the base or tail pages.
+            column (int): The column index.
+            page (Page): The page to be stored.
+
+        Returns:
+            bytes: The encoded or raw contents of the page.
+        """
+        if PAGE_COMPRESSION and not is_tail:
+            encoding, data = encode_page(page.read_many())
+            if encoding != RAW:
+                page_range.page_encodings[(row, column)] = (encoding, len(data))
+                page_range.is_dirty = True
+                return data
+        if not is_tail and page_range.page_encodings.pop((row, column), None) is not None:
+            page_range.is_dirty = True
+        return page.to_bytes()
+
+    def write_page(self, page_range: PageRange, is_tail, row, column, page):
+        """
+        Write a single page to its fixed offset in its column file.
+
+        Args:
+            page_range (PageRange): The page range the page belongs to.
+            is_tail (bool): Whether the page is a tail page.
+            row (int): The index of the page within the base or tail pages.
+            column (int): The column index.
+            page (Page): The page to be written.
+        """
+        self.write_page_data(page_range.index, is_tail, row, column, self.serialize_page(page_range, is_tail, row, column, page))
+        page.is_dirty = False
+
+    def write_page_data(self, page_range_index, is_tail, row, column, data):
+        """
+        Write the contents of a page to its fixed offset in its column file.
+        Called by the background writer of the buffer pool, so it must not take the buffer pool lock.
+
+        Args:
+            page_range_index (int): The index of the page range the page belongs to.
+            is_tail (bool): Whether the page is a tail page.
+            row (int): The index of the page within the base or tail pages.
+            column (int): The column index.
+            data (bytes): The stored contents of the page, see serialize_page.
+        """
+        with self.open_page_range_file(self.get_column_file(page_range_index, column)) as f:
+            f.seek(self.calculate_page_offset(row, is_tail))
             f.write(data)
 
-    def calculate_page_position(self, rid: int = -1):
+    def open_page_range_file(self, page_range_file):
+        """
+        Open a page range or column file for positional writes, creating it and the table directory if needed.
+        The file is never truncated, so concurrent writers of different pages do not lose each other's writes.
+
+        Args:
+            page_range_file (str): The path to the file.
+
+        Returns:
+            BinaryIO: The file opened for reading and writing.
+        """
+        table_directory = os.path.join(self.database_directory, self.name)
+        if not os.path.exists(table_directory):
+            os.makedirs(table_directory, exist_ok=True)
+        return os.fdopen(os.open(page_range_file, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0)), 'r+b')
+
+    def calculate_page_offset(self, row, is_tail=False):
+        """
+        Calculate the offset of a page in its column file.
+        The file holds BASE_PAGES_PER_RANGE base pages followed by the tail pages.
+        Every page has a slot of PAGE_SIZE bytes, compressed pages only use the start of their slot.
+
+        Args:
+            row (int): The index of the page within the base or tail pages.
+            is_tail (bool, optional): Whether the page is a tail page. Defaults to False.
+
+        Returns:
+            int: The byte offset of the page.
+        """
+        if is_tail:
+            row += BASE_PAGES_PER_RANGE
+        return PAGE_SIZE * row
+
+    def get_address(self, rid):
         """
-        Calculate the page range index and page index for a given record identifier.
+        Calculate the page address of a record.
+        Base RIDs are numbered from FIRST_BASE_RID in insertion order and fill the page ranges in order,
+        so the address of a base record is computed from its RID. Tail RIDs are numbered from 0 and
+        their addresses are looked up in the tail directory.
 
         Args:
-            rid (int, optional): The record identifier. Defaults to -1.
+            rid (int): The record identifier.
 
         Returns:
-            tuple: A tuple containing the page range index and page index.
+            tuple: The page range index, whether the record is a tail record,
+                the index of its set of pages and the index of the record within the pages.
+        """
+        if rid >= FIRST_BASE_RID:
+            page_range_index, number = divmod(rid - FIRST_BASE_RID, RECORDS_PER_PAGE * BASE_PAGES_PER_RANGE)
+            return page_range_index, False, number // RECORDS_PER_PAGE, number % RECORDS_PER_PAGE
+        entry = self.tail_directory[rid]
+        number = entry & 0xFFFFFFFF
+        return entry >> 32, True, number // RECORDS_PER_PAGE, number % RECORDS_PER_PAGE
+
+    def has_record(self, rid):
         """
-        if rid == -1:
-            page_range_idx = self.num_records // (RECORDS_PER_PAGE * BASE_PAGES_PER_RANGE)
-            page_idx = self.num_records // RECORDS_PER_PAGE
-        else:
-            page_range_idx = (rid - 92106429) // (RECORDS_PER_PAGE * BASE_PAGES_PER_RANGE)
-            page_idx = -1
-        page_idx = page_idx % BASE_PAGES_PER_RANGE
-        return page_range_idx, page_idx
+        Check whether a record identifier (RID) belongs to a written base or tail record.
+
+        Args:
+            rid (int): The record identifier.
+
+        Returns:
+            bool: True if the record exists, False otherwise.
+        """
+        if rid >= FIRST_BASE_RID:
+            return rid - FIRST_BASE_RID < self.num_records
+        return 0 <= rid < len(self.tail_directory)
 
     def write_base_page(self, columns):
         """
         Write a record to the base pages.
 
         Args:
-            columns (list): A list of column values for the record.
+            columns (list): A list of column values for the record, its RID must be the next base RID.
         """
-        page_range_idx, page_idx = self.calculate_page_position()
-        for i, column in enumerate(columns):
-            page = self.get_page(page_range_idx, i)
-            page_range = self.buffer_pool[page_range_idx]
-            page_range.is_dirty = True
-            page.write(column)
-            # print(int(page_idx))
-            page_range.base_pages[int(page_idx)][i] = page
-            self.buffer_pool[page_range_idx] = page_range
         rid = columns[RID_COLUMN]
-        self.page_directory[rid] = [page.num_records - 1, 'base', page_range_idx, page_idx]
+        page_range_idx = self.get_address(rid)[0]
+        self.bufferpool.append_values(self, page_range_idx, False, columns)
         self.num_records += 1
-        self.key_rids[columns[self.key + METADATA_COLUMNS]] = rid
+
+    def write_base_pages(self, columns):
+        """
+        Write many records to the base pages, filling whole pages column by column and the page ranges one after the other.
+
+        Args:
+            columns (list[Sequence[int]]): The values of the records column by column, including the metadata columns,
+                their RIDs must follow the last base RID.
+        """
+        count = len(columns[0])
+        written = 0
+        while written < count:
+            page_range_index = self.get_address(FIRST_BASE_RID + self.num_records)[0]
+            room = RECORDS_PER_PAGE * BASE_PAGES_PER_RANGE - self.num_records % (RECORDS_PER_PAGE * BASE_PAGES_PER_RANGE)
+            end = min(count, written + room)
+            self.bufferpool.append_many(self, page_range_index, False, [values[written:end] for values in columns])
+            self.num_records += end - written
+            written = end
+
+    def publish_records(self, columns):
+        """
+        Index many base records written by write_base_pages and make them visible to lookups by key,
+        every index and the key map are updated once for all the records.
+
+        Args:
+            columns (list[Sequence[int]]): The values of the records column by column, including the metadata columns.
+        """
+        rids = columns[RID_COLUMN]
+        self.index.push_many(columns[METADATA_COLUMNS:], rids)
+        self.key_rids.update(list(zip(columns[self.key + METADATA_COLUMNS], rids)))
+
+    def publish_record(self, columns):
+        """
+        Index a base record written by write_base_page and make it visible to lookups by key.
+        It does not need the insert lock, so inserts do not wait for each other's index maintenance,
+        the record cannot be updated or deleted before it is published.
+
+        Args:
+            columns (list): The column values of the record, including the metadata columns.
+        """
+        rid = columns[RID_COLUMN]
         self.index.push_index(columns[METADATA_COLUMNS:len(columns) + 1], rid)
+        self.key_rids[columns[self.key + METADATA_COLUMNS]] = rid
 
     def write_tail_page(self, columns):
         """
-        Write a record to the tail pages.
+        Write a record to the tail pages of the page range of its base record.
 
         Args:
-            columns (list): A list of column values for the record.
+            columns (list): A list of column values for the record, its RID must be the next tail RID.
         """
-        page_range_idx, page_idx = self.calculate_page_position(columns[BASE_RID_COLUMN])
-        for i, column in enumerate(columns):
-            page_range = self.buffer_pool[page_range_idx]
-            page_range.is_dirty = True
-            page = self.get_page(page_range_idx, i, False)
-            page.write(column)
-            page_idx = len(page_range.tail_pages) - 1
-            page_range.tail_pages[-1][i] = page
-            self.buffer_pool[page_range_idx] = page_range
-        rid = columns[RID_COLUMN]
-        self.page_directory[rid] = [page.num_records - 1, 'tail', page_range_idx, page_idx]
+        page_range_idx = self.get_address(columns[BASE_RID_COLUMN])[0]
+        page_idx, offset = self.bufferpool.append_values(self, page_range_idx, True, columns)
+        self.tail_directory.append(page_range_idx << 32 | page_idx * RECORDS_PER_PAGE + offset)
         self.num_updates += 1
-        self.index.push_index(columns[METADATA_COLUMNS:len(columns) + 1], rid)
+
+    def next_timestamp(self):
+        """
+        Get the timestamp of a new record version.
+        Timestamps follow the wall clock in nanoseconds but never repeat or go backwards.
+
+        Returns:
+            int: The timestamp.
+        """
+        with self.timestamp_lock:
+            self.last_timestamp = max(time_ns(), self.last_timestamp + 1)
+            return self.last_timestamp
+
+    def next_timestamps(self, count):
+        """
+        Reserve the timestamps of many new record versions.
+
+        Args:
+            count (int): The number of timestamps.
+
+        Returns:
+            int: The first timestamp, the others follow it one nanosecond apart.
+        """
+        with self.timestamp_lock:
+            first = max(time_ns(), self.last_timestamp + 1)
+            self.last_timestamp = first + count - 1
+            return first
+
+    def get_keys(self, start, end):
+        """
+        Get the keys between start and end, both included, in ascending order.
+        Only the keys that exist are visited.
+
+        Args:
+            start (int): The smallest key.
+            end (int): The largest key.
+
+        Returns:
+            list[int]: The keys of the records in the range.
+        """
+        start, end = max(start, 0), min(end, MAX_VALUE)
+        if start > end:
+            return []
+        return list(self.key_rids.keys(start, end))
+
+    def get_key_rid_batches(self, start, end, batch_size=AGGREGATE_BATCH_SIZE):
+        """
+        Get the base RIDs of the records with keys between start and end, both included, in ascending key order and a batch at a time.
+        Every batch is read from the key map separately, so the range is never held at once.
+
+        Args:
+            start (int): The smallest key.
+            end (int): The largest key.
+            batch_size (int, optional): The largest number of RIDs of a batch. Defaults to AGGREGATE_BATCH_SIZE.
+
+        Yields:
+            list[int]: The base RIDs of the next records of the range.
+        """
+        start, end = max(start, 0), min(end, MAX_VALUE)
+        is_start_excluded = False
+        while start <= end:
+            items = list(islice(self.key_rids.items(start, end, excludemin=is_start_excluded), batch_size))
+            if len(items) == 0:
+                return
+            yield [rid for _, rid in items]
+            if len(items) < batch_size:
+                return
+            # The next batch starts after the last key read
+            start, is_start_excluded = items[-1][0], True
+
+    def read_columns(self, rids, columns, metadata_columns=()):
+        """
+        Read the latest values of some columns of base records, reading every page involved once as a NumPy array.
+        A column of a record is only read from its latest tail record when the schema encoding of the base record marks it as updated.
+
+        Args:
+            rids (Sequence[int]): The base RIDs of the records.
+            columns (Sequence[int]): The column indexes, not counting the metadata columns.
+            metadata_columns (Sequence[int], optional): Metadata columns whose base record values are read as well. Defaults to none.
+
+        Returns:
+            list[numpy.ndarray]: The latest values of every column as unsigned 64-bit integers, in the order of the records,
+                followed by the values of the metadata columns.
+        """
+        numbers = numpy.asarray(rids, dtype=numpy.uint64) - numpy.uint64(FIRST_BASE_RID)
+        page_range_indexes, numbers = numpy.divmod(numbers, RECORDS_PER_PAGE * BASE_PAGES_PER_RANGE)
+        rows, offsets = numpy.divmod(numbers, RECORDS_PER_PAGE)
+        base_columns = [column + METADATA_COLUMNS for column in columns] + list(metadata_columns) + [INDIRECTION_COLUMN, SCHEMA_ENCODING_COLUMN]
+        *values, indirections, schema_encodings = self.gather_values(page_range_indexes, False, rows, offsets, base_columns)
+        self.resolve_tail_values(columns, values, indirections, schema_encodings)
+        return values
+
+    def resolve_tail_values(self, columns, values, indirections, schema_encodings):
+        """
+        Replace the base values of the updated columns of base records by the values of their latest tail records.
+        A column of a record is only read from its tail record when the schema encoding of the base record marks it as updated.
+
+        Args:
+            columns (Sequence[int]): The column indexes, not counting the metadata columns.
+            values (list[numpy.ndarray]): The base values of every column, updated in place.
+            indirections (numpy.ndarray): The indirection of every base record.
+            schema_encodings (numpy.ndarray): The schema encoding of every base record.
+        """
+        updated = numpy.flatnonzero(indirections != numpy.uint64(MAX_VALUE))
+        if len(updated) == 0:
+            return
+        # The tail directory is not exported as a buffer, which would keep updates from growing it
+        entries = numpy.fromiter(map(self.tail_directory.__getitem__, indirections[updated].tolist()), dtype=numpy.uint64, count=len(updated))
+        tail_page_range_indexes = entries >> numpy.uint64(32)
+        tail_rows, tail_offsets = numpy.divmod(entries & numpy.uint64(0xFFFFFFFF), RECORDS_PER_PAGE)
+        for column, column_values in zip(columns, values):
+            # Tail records do not store the key
+            if column == self.key:
+                continue
+            selected = numpy.flatnonzero((schema_encodings[updated] >> numpy.uint64(column)) & numpy.uint64(1) == 1)
+            if len(selected) > 0:
+                tail_values = self.gather_values(tail_page_range_indexes[selected], True, tail_rows[selected], tail_offsets[selected], [column + METADATA_COLUMNS])
+                column_values[updated[selected]] = tail_values[0]
+
+    def scan_pages(self, columns):
+        """
+        Scan the latest values of some columns of the base records that are not deleted, one base page at a time,
+        so that only the arrays of one page are held at once.
+
+        Args:
+            columns (Sequence[int]): The column indexes, not counting the metadata columns.
+
+        Yields:
+            tuple: The base RIDs of the records of the page as a NumPy array and the list of the arrays of their latest values.
+        """
+        base_columns = [column + METADATA_COLUMNS for column in columns] + [RID_COLUMN, INDIRECTION_COLUMN, SCHEMA_ENCODING_COLUMN]
+        num_records = self.num_records
+        for number in range(0, num_records, RECORDS_PER_PAGE):
+            page_range_index, _, row, _ = self.get_address(FIRST_BASE_RID + number)
+            end = min(RECORDS_PER_PAGE, num_records - number)
+            *values, rids, indirections, schema_encodings = self.read_page_arrays(page_range_index, False, row, base_columns, end)
+            # Deleted records have their RID set to MAX_VALUE
+            live = rids != numpy.uint64(MAX_VALUE)
+            if not live.all():
+                values = [column_values[live] for column_values in values]
+                rids, indirections, schema_encodings = rids[live], indirections[live], schema_encodings[live]
+            self.resolve_tail_values(columns, values, indirections, schema_encodings)
+            yield rids, values
+
+    def gather_values(self, page_range_indexes, is_tail, rows, offsets, columns):
+        """
+        Read the values of some columns at the given record addresses, reading every page once.
+
+        Args:
+            page_range_indexes (numpy.ndarray): The page range index of every record.
+            is_tail (bool): Whether the records are tail records.
+            rows (numpy.ndarray): The index of the pages of every record within the base or tail pages.
+            offsets (numpy.ndarray): The index of every record within its pages.
+            columns (Sequence[int]): The column indexes to read, counting the metadata columns.
+
+        Returns:
+            list[numpy.ndarray]: The values of every column, in the order of the records.
+        """
+        values = [numpy.empty(len(offsets), dtype=numpy.uint64) for _ in columns]
+        pages = (page_range_indexes.astype(numpy.uint64) << numpy.uint64(32)) | rows.astype(numpy.uint64)
+        order = numpy.argsort(pages, kind='stable')
+        page_ids, starts = numpy.unique(pages[order], return_index=True)
+        ends = numpy.append(starts[1:], len(order))
+        for page_id, start, end in zip(page_ids.tolist(), starts.tolist(), ends.tolist()):
+            selected = order[start:end]
+            selected_offsets = offsets[selected].astype(numpy.intp)
+            pages = self.read_page_arrays(page_id >> 32, is_tail, page_id & 0xFFFFFFFF, columns)
+            for column_values, data in zip(values, pages):
+                column_values[selected] = data[selected_offsets]
+        return values
+
+    def read_page_arrays(self, page_range_index, is_tail, row, columns, end=RECORDS_PER_PAGE):
+        """
+        Copy the values of the pages of some columns at the same position as NumPy arrays.
+        The pages are pinned together and copied after the buffer pool lock is released.
+
+        Args:
+            page_range_index (int): The index of the page range.
+            is_tail (bool): Whether the pages are tail pages.
+            row (int): The index of the pages within the base or tail pages.
+            columns (Sequence[int]): The column indexes, counting the metadata columns.
+            end (int, optional): The number of records to copy. Defaults to RECORDS_PER_PAGE.
+
+        Returns:
+            list[numpy.ndarray]: The first end values of every page as unsigned 64-bit integers.
+        """
+        pages = []
+        try:
+            for column in columns:
+                pages.append(self.bufferpool.pin_page(self, page_range_index, is_tail, row, column))
+            return [page.to_array()[:end] for page in pages]
+        finally:
+            for page in pages:
+                self.bufferpool.unpin_page(page)
 
     def get_rids(self, column, value):
         """
-        Get the record identifiers (RIDs) of records that match the given column value.
+        Get the base record identifiers (RIDs) of the records whose latest value matches the given column value.
+        Only the searched columns are read, one base page at a time, and from the tail records only for the rows where they were updated.
 
         Args:
-            column (int): The column index.
-            value (int): The column value to match.
+            column (int | tuple[int, ...]): The column index, or a tuple of column indexes.
+            value (int | tuple[int, ...]): The column value to match, or the tuple of the values of the columns.
 
         Returns:
-            list: A list of record identifiers.
+            list: The base RIDs of the matching records that are not deleted, in ascending order.
         """
-        rids = []
-        for rid in self.page_directory:
-            record = self.get_record(rid)
-            if record[column + METADATA_COLUMNS] == value:
-                rids.append(rid)
-        return rids
+        columns = column if isinstance(column, tuple) else (column,)
+        values = value if isinstance(column, tuple) else (value,)
+        if not all(0 <= column_value <= MAX_VALUE for column_value in values):
+            return []
+        matches = []
+        for rids, latest in self.scan_pages(columns):
+            matching = numpy.ones(len(rids), dtype=bool)
+            for column_values, column_value in zip(latest, values):
+                matching &= column_values == numpy.uint64(column_value)
+            matches.extend(rids[matching].tolist())
+        return matches
+
+    def get_rids_many(self, column, values):
+        """
+        Get the base RIDs of the records whose latest value matches each of several values of a column,
+        in a single scan of the column one base page at a time.
+
+        Args:
+            column (int): The column index.
+            values (Sequence[int]): The column values to match.
 
-    def get_record(self, rid):
+        Returns:
+            list[list[int]]: The base RIDs of the matching records that are not deleted for every value, in ascending order.
+        """
+        # The distinct searched values in ascending order, a value of a page is found among them by a binary search
+        searched = numpy.array(sorted({value for value in values if 0 <= value <= MAX_VALUE}), dtype=numpy.uint64)
+        matches = [[] for _ in searched]
+        if len(searched) > 0:
+            for rids, (column_values,) in self.scan_pages([column]):
+                positions = numpy.minimum(numpy.searchsorted(searched, column_values), len(searched) - 1)
+                matching = numpy.flatnonzero(searched[positions] == column_values)
+                for position, rid in zip(positions[matching].tolist(), rids[matching].tolist()):
+                    matches[position].append(rid)
+        index = {value: position for position, value in enumerate(searched.tolist())}
+        return [list(matches[index[value]]) if value in index else [] for value in values]
+
+    def get_record(self, rid, columns=None):
         """
         Get a record by its record identifier (RID).
+        Only the pages of the requested columns are read, so a projection does not load the other columns.
 
         Args:
             rid (int): The record identifier.
+            columns (Iterable[int] | None, optional): The indexes of the columns to read, counting the metadata columns.
+                Defaults to all columns.
 
         Returns:
-            list: A list of column values for the record.
+            list: A list of column values for the record, None for the columns that were not read.
         """
-        record = []
-        directory = self.page_directory[rid]
-        for column in range(METADATA_COLUMNS + self.num_columns):
-            record.append(self.get_value(column, directory))
+        address = self.get_address(rid)
+        if columns is None:
+            return self.bufferpool.read_values(self, *address, range(METADATA_COLUMNS + self.num_columns))
+        columns = sorted(set(columns))
+        record = [None] * (METADATA_COLUMNS + self.num_columns)
+        values = self.bufferpool.read_values(self, *address, columns)
+        for column, value in zip(columns, values):
+            record[column] = value
         return record
 
-    def get_value(self, column, directory):
+    def get_value(self, column, rid):
         """
         Get the value of a specific column in a record.
 
         Args:
             column (int): The column index.
-            directory (list): The page directory entry for the record.
+            rid (int): The record identifier.
 
         Returns:
             int: The value of the column.
         """
-        page = self.get_page(directory[2], column, directory[1] == 'base', False, directory[3])
-        return page.read(directory[0])
+        return self.bufferpool.read_values(self, *self.get_address(rid), (column,))[0]
 
-    def update_value(self, column, directory, value):
+    def update_value(self, column, rid, value):
         """
         Update the value of a specific column in a record.
 
         Args:
             column (int): The column index.
-            directory (list): The page directory entry for the record.
+            rid (int): The record identifier.
             value (int): The new value for the column.
         """
-        page = self.get_page(directory[2], column, directory[1] == 'base', False, directory[3])
-        page.write(value, directory[0])
+        self.bufferpool.write_value(self, *self.get_address(rid), column, value)
 
-    def get_page(self, page_range_index, column, is_base=True, current=True, page_number=0):
+    def get_page_range(self, page_range_index):
         """
-        Get a page from the buffer pool or disk.
+        Get a page range, reading its header from disk or creating it if it does not exist yet.
+        The buffer pool releases page ranges without resident pages, so callers outside the buffer pool
+        must not keep the returned object.
 
         Args:
             page_range_index (int): The index of the page range.
-            column (int): The column index.
-            is_base (bool, optional): Whether the page is a base page. Defaults to True.
-            current (bool, optional): Whether to get the current page. Defaults to True.
-            page_number (int, optional): The page number within the page range. Defaults to 0.
 
         Returns:
-            Page: The requested page object.
+            PageRange: The page range object.
         """
-        page_range = None
-        if page_range_index in self.buffer_pool:
-            page_range = self.buffer_pool[page_range_index]
-            page_range.index = page_range_index
-            self.lru.page_range_accessed(page_range)
-        elif os.path.exists(os.path.join(self.database_directory, self.name, f'{page_range_index}.page_range')) and os.path.isfile(os.path.join(self.database_directory, self.name, f'{page_range_index}.page_range')):
-            page_range = self.read_page_range(os.path.join(self.database_directory, self.name, f'{page_range_index}.page_range'))
-            self.buffer_pool[page_range_index] = page_range
-            self.lru.page_range_created(page_range)
-        else:
-            # print(self.num_columns,METADATA_COLUMNS)
-            page_range = PageRange(self.num_columns + METADATA_COLUMNS)
-            page_range.index = page_range_index
-            self.buffer_pool[page_range_index] = page_range
-            self.lru.page_range_created(page_range)
-        if current:
-            if is_base:
-                return page_range.get_base_page_by_column(column)
+        page_range = self.page_ranges.get(page_range_index)
+        if page_range is not None:
+            return page_range
+        with self.bufferpool.lock:
+            if page_range_index in self.page_ranges:
+                return self.page_ranges[page_range_index]
+            page_range_file = self.get_page_range_file(page_range_index)
+            if os.path.isfile(page_range_file):
+                page_range = self.read_page_range(page_range_file)
             else:
-                return page_range.get_tail_page_by_column(column)
-        else:
-            if is_base:
-                return page_range.base_pages[page_number][column]
-            else:
-                return page_range.tail_pages[page_number][column]
+                page_range = PageRange(self.num_columns + METADATA_COLUMNS)
+            page_range.index = page_range_index
+            self.page_ranges[page_range_index] = page_range
+            self.page_range_indexes.add(page_range_index)
+            self.bufferpool.register_page_range(page_range)
+            return page_range